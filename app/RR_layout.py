@@ -2,15 +2,19 @@
 Module responsible for plots placement
 """
 from PyQt6.QtCore import Qt
-from PyQt6.QtWidgets import QLabel
-from graph import create_graph
+from PyQt6.QtWidgets import QLabel, QVBoxLayout
+from graph import create_graph, create_timeline
 
 def create_RR_layout(obj):
     """
     Function handling buttons placement
     """
     create_graph(obj)
-    obj.RR_layout.addWidget(obj.graphWidget)
+    create_timeline(obj)
+    obj.signal_layout = QVBoxLayout()
+    obj.signal_layout.addWidget(obj.graphWidget)
+    obj.signal_layout.addWidget(obj.timelineWidget)
+    obj.RR_layout.addLayout(obj.signal_layout)
     obj.hrv_label = QLabel("Waiting for signal")
     #obj.hrv_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
     #obj.RR_layout.addWidget(obj.hrv_label) to uncomment if HRV back
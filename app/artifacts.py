@@ -1,370 +1,181 @@
 """
 Module responsible for automatic artifact detection and correction.
 """
+import warnings
+
 import numpy as np
-from scipy import interpolate
-import scipy as sp
-import pandas as pd
+from interval import ARTIFACT_TYPES, NO_ARTIFACT, CORRECTION_METHODS
+from timing import timed
+
+from detectors import (TarvainenParams, T1Params, T2Params, T3Params,
+                       QuotientParams, SquareParams, run_detectors)
 
-def find_art_tarvainen(obj,
-                        c1=0.13,
-                        c2=0.17,
-                        alpha=5.2,
-                        window_width=91,
-                        medfilt_order=11):
+@timed()
+def detect_tarvainen(rr, return_classes=False, progress=None, **tarvainen_params):
     """
-    Function to detect artifats with a use of Tarvainen filter
+    Function to detect artifats in RR series with a use of Tarvainen filter.
+    progress(percent) is called between the stages of the detection, if given.
     """
-
-    def _compute_threshold(signal, alpha, window_width):
-        df = pd.DataFrame({"signal": np.abs(signal)})
-        q1 = (
-            df.rolling(window_width, center=True, min_periods=1)
-            .quantile(0.25)
-            .signal
-        )
-        q3 = (
-            df.rolling(window_width, center=True, min_periods=1)
-            .quantile(0.75)
-            .signal
-        )
-        th = alpha * ((q3 - q1) / 2)
-
-        return th
-
-    rr = list(map(lambda x: x.value, obj.examination.RR_intervals))
-    drrs = np.ediff1d(rr, to_begin=0)
-    drrs[0] = np.mean(drrs[1:])
-    th1 = _compute_threshold(drrs, alpha, window_width)
-    # Ignore division by 0 warning
-    old_setting = np.seterr(divide="ignore", invalid="ignore")
-    drrs /= th1
-    # Return old setting
-    np.seterr(**old_setting)
-    padding = 2
-    drrs_pad = np.pad(drrs, padding, "reflect")
-
-    s12 = np.zeros(drrs.size)
-    for d in np.arange(padding, padding + drrs.size):
-        if drrs_pad[d] > 0:
-            s12[d - padding] = np.max([drrs_pad[d - 1], drrs_pad[d + 1]])
-        elif drrs_pad[d] < 0:
-            s12[d - padding] = np.min([drrs_pad[d - 1], drrs_pad[d + 1]])
-    # Cast dRRs to subspace s22.
-    s22 = np.zeros(drrs.size)
-    for d in np.arange(padding, padding + drrs.size):
-        if drrs_pad[d] >= 0:
-            s22[d - padding] = np.min([drrs_pad[d + 1], drrs_pad[d + 2]])
-        elif drrs_pad[d] < 0:
-            s22[d - padding] = np.max([drrs_pad[d + 1], drrs_pad[d + 2]])
-    # Compute mRRs: time series of deviation of RRs from median.
-    df = pd.DataFrame({"signal": rr})
-    medrr = df.rolling(medfilt_order, center=True, min_periods=1).median().signal.values
-    mrrs = rr - medrr
-    mrrs[mrrs < 0] = mrrs[mrrs < 0] * 2
-    # Normalize by threshold.
-    th2 = _compute_threshold(mrrs, alpha, window_width)
-    mrrs /= th2
-    # Artifact classes.
-    artifacts = []
-    extra_idcs = []
-    missed_idcs = []
-    ectopic_idcs = []
-    longshort_idcs = []
-
-    i = 0
-    while i < len(rr) - 2: 
-        if np.abs(drrs[i]) <= 1:  
-            i += 1
-            continue
-        eq1 = np.logical_and(
-            drrs[i] > 1, s12[i] < (-c1 * drrs[i] - c2)
-        )  
-        eq2 = np.logical_and(
-            drrs[i] < -1, s12[i] > (-c1 * drrs[i] + c2)
-        )  
-        if np.any([eq1, eq2]):
-            # If any of the two equations is true.
-            ectopic_idcs.append(i)
-            i += 1
-            continue
-        # If none of the two equations is true.
-        if ~np.any([np.abs(drrs[i]) > 1, np.abs(mrrs[i]) > 3]):
-            i += 1
-            continue
-        longshort_candidates = [i]
-        # Check if the following beat also needs to be evaluated.
-        if np.abs(drrs[i + 1]) < np.abs(drrs[i + 2]):
-            longshort_candidates.append(i + 1)
-        for j in longshort_candidates:
-            # Long beat.
-            eq3 = np.logical_and(drrs[j] > 1, s22[j] < -1)  
-            # Long or short.
-            eq4 = np.abs(mrrs[j]) > 3 
-            # Short beat.
-            eq5 = np.logical_and(drrs[j] < -1, s22[j] > 1) 
-
-            if ~np.any([eq3, eq4, eq5]):
-                # If none of the three equations is true: normal beat.
-                i += 1
-                continue
-            # If any of the three equations is true: check for missing or extra
-            # peaks.
-
-            # Missing.
-            eq6 = np.abs(rr[j] / 2 - medrr[j]) < th2[j]  # Figure 1
-            # Extra.
-            eq7 = np.abs(rr[j] + rr[j + 1] - medrr[j]) < th2[j]  # Figure 1
-
-            # Check if extra.
-            if np.all([eq5, eq7]):
-                extra_idcs.append(j)
-                i += 1
-                continue
-            # Check if missing.
-            if np.all([eq3, eq6]):
-                missed_idcs.append(j)
-                i += 1
-                continue
-            # If neither classified as extra or missing, classify as "long or
-            # short".
-            longshort_idcs.append(j)
-            i += 1
-
-    for artifact_type in (extra_idcs, missed_idcs, ectopic_idcs, longshort_idcs):
-        artifacts.extend(artifact_type)
-    
+    found, details = run_detectors(rr, {"Tarvainen": TarvainenParams(**tarvainen_params)}, progress)
+    artifacts = found["Tarvainen"].tolist()
+    if return_classes:
+        return artifacts, details["Tarvainen"]
     return artifacts
 
-def find_art1(obj):
+def detect_t1(rr, diff):
     """
-    Function to detect artifats type T1 defined by Giles.
+    Function to detect artifats type T1 defined by Giles in RR series.
     """
-    diff = int(obj.textbox_art1.text())
-    # count differences between this and previous interval
-    d_prev = [1 if abs(obj.examination.RR_intervals[i].value - obj.examination.RR_intervals[i-1].value) > diff else 0 for i in range(1, len(obj.examination.RR_intervals))]
-    d_prev.insert(0, 0)
-    # count differences between this and next interval
-    d_next = [1 if abs(obj.examination.RR_intervals[i-1].value - obj.examination.RR_intervals[i].value) > diff else 0 for i in range(1, len(obj.examination.RR_intervals))]
-    d_next.insert(-1, 0)
-
-    final_list = [sum(value) for value in zip(d_prev, d_next)]
-    #check for last interval
-    if abs(obj.examination.RR_intervals[-1].value - obj.examination.RR_intervals[-2].value) > diff:
-        final_list[-1] = 2
-    
-    idx = np.where(np.array(final_list) == 2)[0]
-
-    return idx.tolist()
+    return run_detectors(rr, {"T1": T1Params(diff)})[0]["T1"].tolist()
 
-def find_art2(obj):
+def detect_t2(rr, diff, diff_t1):
     """
-    Function to detect artifats type T2 defined by Giles.
+    Function to detect artifats type T2 defined by Giles in RR series.
+    Artifacts of type T1 (found with diff_t1) are excluded.
     """
-    diff = int(obj.textbox_art2.text())
-    # count differences between this and previous interval
-    d_next = [1 if (obj.examination.RR_intervals[i-1].value - obj.examination.RR_intervals[i].value) > diff else 0 for i in range(1, len(obj.examination.RR_intervals))]
-    d_next.insert(-1, 0)
-    # check for last sample
-    if obj.examination.RR_intervals[-2].value - obj.examination.RR_intervals[-1].value > diff:
-        d_next[-1] = 1
+    return run_detectors(rr, {"T2": T2Params(diff, diff_t1)})[0]["T2"].tolist()
 
-    idx = np.where(np.array(d_next) == 1)[0]
-    art1 = find_art1(obj)
-    final = [x for x in idx if x not in art1]
-    return final
-
-def find_art3(obj):
+def detect_t3(rr, diff, diff_t1):
     """
-    Function to detect artifats type T3 defined by Giles.
+    Function to detect artifats type T3 defined by Giles in RR series.
+    Artifacts of type T1 (found with diff_t1) are excluded.
     """
-    diff = int(obj.textbox_art3.text())
-    # count differences between this and previous interval
-    d_next = [1 if (obj.examination.RR_intervals[i-1].value - obj.examination.RR_intervals[i].value) > diff else 0 for i in range(0, len(obj.examination.RR_intervals)-1)]
-    d_next.insert(-1, 0)
-    # check for last sample
-    if obj.examination.RR_intervals[-1].value - obj.examination.RR_intervals[-2].value > diff:
-        d_next[-1] = 1
-    idx = np.where(np.array(d_next) == 1)[0]
-    art1 = find_art1(obj)
-    final = [x for x in idx if x not in art1]
-    return final
+    return run_detectors(rr, {"T3": T3Params(diff, diff_t1)})[0]["T3"].tolist()
 
-def find_art_quotient(obj):
+def detect_quotient(x):
     """
-    Function to find artifacts with a use of Piskorski-Guzik quotient filter.
+    Function to find artifacts in RR series with a use of Piskorski-Guzik quotient filter.
     """
-    x = np.array([interval.value for interval in obj.examination.RR_intervals])
-    L = len(x) - 1
-    condition1 = x[:L] / x[1:] < 0.8
-    condition2 = x[:L] / x[:L] > 1.2
-    condition3 = x[1:] / x[:L] < 0.8
-    condition4 = x[1:] / x[:L] > 1.2
-
-    indices_p = np.where(condition1 | condition2 | condition3 | condition4)[0]
-    indices_m = indices_p - 1
-    indices = np.concatenate((indices_p, indices_m))
-    return indices.tolist()
+    return run_detectors(x, {"Quotient": QuotientParams()})[0]["Quotient"].tolist()
 
-def find_art_square(obj):
+def detect_square(x):
     """
-    Function to find artifacts with a use of Piskorski-Guzik square filter.
+    Function to find artifacts in RR series with a use of Piskorski-Guzik square filter.
     """
-    x = np.array([interval.value for interval in obj.examination.RR_intervals])
-    L = len(x) - 1
-    indices = np.where((x[:L] < 300) | (x[:L] > 2000))[0]
-
-    # Creating indices_p and indices_m
-    indices_p = indices
-    indices_m = indices - 1
-
-    # Concatenating indices_p and indices_m
-    indices = np.concatenate((indices_p, indices_m))
-
-    return indices.tolist()
+    return run_detectors(x, {"Square": SquareParams()})[0]["Square"].tolist()
 
+def detector_params(obj, atypes):
+    """
+    Parameters of detectors of atypes as set in the GUI
+    """
+    diff_t1 = int(obj.textbox_art1.text())
+    params = {"Tarvainen": TarvainenParams(),
+              "Quotient": QuotientParams(),
+              "Square": SquareParams(),
+              "T1": T1Params(diff_t1),
+              "T2": T2Params(int(obj.textbox_art2.text()), diff_t1),
+              "T3": T3Params(int(obj.textbox_art3.text()), diff_t1)}
+    return {atype: params[atype] for atype in atypes}
+
+@timed()
+def find_artifacts(obj, atypes):
+    """
+    Function to detect artifacts of atypes in one pass over the examination,
+    with parameters set in the GUI. Returns dict: artifact type -> indices.
+    """
+    return run_detectors(obj.examination.RR, detector_params(obj, atypes))[0]
 
-def remove_artifacts(obj):
+def correction_params(obj):
     '''
-    Function to correct chosen artifacts
+    Function reading parameters of correct_artifacts chosen in the GUI
     '''
-    # Check for chosen artifacts types
-    atypes = obj.chosen_artifacts
     # Check for chosen correction method
     for m in [obj.m1, obj.m2, obj.m3, obj.m4, obj.m5]:
         if m.isChecked() == True:
             method = m.text()
-    
-    idx = np.array([])
+    return {"atypes": list(obj.chosen_artifacts),
+            "method": method,
+            "exam_start": obj.exam_start,
+            "exam_stop": obj.exam_stop,
+            "pre_mean_count": int(obj.pre_mean_count.currentText())}
+
+@timed()
+def correct_artifacts(exam, atypes, method, exam_start, exam_stop, pre_mean_count=4, progress=None):
+    '''
+    Function to correct artifacts of chosen types found between exam_start and exam_stop.
+    Returns indices (before correction) of intervals removed from the examination.
+    progress(percent) is called between the stages, if given.
+    '''
+    progress = progress or (lambda percent: None)
+    progress(0)
+    n = len(exam.RR)
+    in_range = np.zeros(n, dtype=bool)
+    in_range[max(int(exam_start), 0):int(exam_stop) + 1] = True
+    to_correct = exam.flagged(atypes) & in_range
+    # Each interval keeps the first of chosen types it was found with
     for atype in atypes:
-        # Add artifacts to list for correction
-        for el in obj.examination.artifacts[atype]:
-            if (el >= obj.exam_start and el <= obj.exam_stop):
-                idx = np.append(idx, el)
-                if obj.examination.RR_intervals[int(el)].artifact == None:
-                    obj.examination.RR_intervals[int(el)].artifact = atype
+        first_found = exam.flagged([atype]) & to_correct & (exam.artifact_type == NO_ARTIFACT)
+        exam.artifact_type[first_found] = ARTIFACT_TYPES.index(atype)
 
     # Check if there are any artifacts to be corrected
-    if len(idx) > 0:
-        for i in idx:
-            obj.examination.RR_intervals[int(i)].value = np.nan
-
-        RR_with_nan = np.array([interval.value for interval in obj.examination.RR_intervals])
-        inds = np.arange(RR_with_nan.shape[0])
-        values = np.where(np.isfinite(RR_with_nan))
-        nan_values = np.where(~np.isfinite(RR_with_nan))
-
-        deleted = np.empty(0)
-        # Correct with linear interpolation
-        if method == "linear interpolation":
-            f = interpolate.interp1d(inds[~np.isnan(RR_with_nan)], RR_with_nan[~np.isnan(RR_with_nan)], bounds_error=False)
-
-            for i, interval in enumerate(obj.examination.RR_intervals):
-                # Check if the interval value needs correction (e.g., if it's NaN)
-                if np.isnan(interval.value):
-                    # Apply linear interpolation based on the index associated with the interval
-                    interval.value = f(i)
-                    interval.correction_methods[method] += 1
-
-        # Correct with cubic splain
-        elif method == "cubic splain":
-            f = sp.interpolate.CubicSpline(inds[values], RR_with_nan[values])
-            for i, interval in enumerate(obj.examination.RR_intervals):
-                # Check if the interval value needs correction (e.g., if it's NaN)
-                if np.isnan(interval.value):
-                    # Apply linear interpolation based on the index associated with the interval
-                    interval.value = f(i)
-                    interval.correction_methods[method] += 1
-        
-        elif method == "deletion":
-            nan_indices = [i for i, interval in enumerate(obj.examination.RR_intervals) if np.isnan(interval.value)]
-            nan_indices = sorted(set(nan_indices), reverse=True)
-            for nan_idx in nan_indices:
-                for key in obj.examination.artifacts.keys():
-                    if nan_idx in obj.examination.artifacts[key]:
-                        obj.examination.artifacts[key].remove(nan_idx)
-                        obj.examination.RR_intervals.pop(nan_idx)
-                    obj.examination.artifacts[key] = [x - 1 if x > nan_idx else x for x in obj.examination.artifacts[key]]
-                                                                                                                                                 
-        # Correct with moving average
-        elif method == "moving average":
-            for val in inds[nan_values]:
-                # Check if the probe has 3 probes before and after it
-                if 3 <= val <= len(obj.examination.RR_intervals) - 3:
-                    neighborhood = RR_with_nan[val - 3:val + 4]
-                    temp_means = []
-                    for i in range(4):
-                        temp_means.append(np.nanmean(neighborhood[i:i+4]))
-                    
-                    obj.examination.RR_intervals[val].value = np.mean(temp_means)
-                    obj.examination.RR_intervals[val].correction_methods[method] += 1
-
-                # If probe does not have enough neighbours (+/-3) - correct with interpolation
-                else:
-                    f = interpolate.interp1d(inds[nan_values], RR_with_nan[nan_values], bounds_error=False)                            
-                    if np.isnan(obj.examination.RR_intervals[val].value):
-                        # Apply linear interpolation based on the index associated with the interval
-                        obj.examination.RR_intervals[val].value = f(i)
-                        obj.examination.RR_intervals[val].correction_methods["linear interpolation"] += 1
-
-            # if any nans left (happen if there are many nans near each other or at the beggining/end - interpolate)
-            RR_with_nan_new = np.array([interval.value for interval in obj.examination.RR_intervals])
-            f = interpolate.interp1d(inds[~np.isnan(RR_with_nan_new)], RR_with_nan[~np.isnan(RR_with_nan_new)], bounds_error=False)
-            for i, interval in enumerate(obj.examination.RR_intervals):
-                # Check if the interval value needs correction (e.g., if it's NaN)
-                if np.isnan(interval.value):
-                    # Apply linear interpolation based on the index associated with the interval
-                    interval.value = f(i)
-                    interval.correction_methods["linear interpolation"] += 1
-
-        elif method == "pre mean":
-            for val in inds[nan_values]:
-                value_from_gui = int(obj.pre_mean_count.currentText())
-                # Check for neighbourhood
-                if value_from_gui <= val <= len(obj.examination.RR_intervals):
-                    neighborhood = RR_with_nan[val - value_from_gui:val]
-                    
-                    obj.examination.RR_intervals[val].value = np.mean(neighborhood)
-                    obj.examination.RR_intervals[val].correction_methods[method] += 1
-
-                # If probe does not have enough neighbours (+/-3) - correct with interpolation
-                else:
-                    f = interpolate.interp1d(inds[nan_values], RR_with_nan[nan_values], bounds_error=False)
-                    if np.isnan(obj.examination.RR_intervals[val].value):
-                        # Apply cubic spline interpolation based on the index associated with the interval
-                        obj.examination.RR_intervals[val].value = f(val)
-                        obj.examination.RR_intervals[val].correction_methods["linear interpolation"] += 1
-
-            # if any nans left (happen if there are many nans near each other or at the beggining/end - interpolate)
-            RR_with_nan_new = np.array([interval.value for interval in obj.examination.RR_intervals])
-            f = interpolate.interp1d(inds[~np.isnan(RR_with_nan_new)], RR_with_nan_new[~np.isnan(RR_with_nan_new)], bounds_error=False)
-            for i, interval in enumerate(obj.examination.RR_intervals):
-                # Check if the interval value needs correction (e.g., if it's NaN)
-                if np.isnan(interval.value):
-                    # Apply linear interpolation based on the index associated with the interval
-                    interval.value = f(i)
-                    interval.correction_methods["linear interpolation"] += 1
-
-
-        # Remove NANs from the beggining of examination - those values could not be interpolated
-        while np.isnan(obj.examination.RR_intervals[0].value):
-            obj.examination.RR_intervals.pop(0)
-            for key in obj.examination.artifacts.keys():
-                obj.examination.artifacts[key] = [x - 1 for x in obj.examination.artifacts[key]]
-        
-        # Remove NANs from the end of examination - those values could not be interpolated
-        while np.isnan(obj.examination.RR_intervals[-1].value):
-            obj.examination.RR_intervals.pop(-1)
-            for key in obj.examination.artifacts.keys():
-                if len(obj.examination.RR_intervals) in obj.examination.artifacts[key]:
-                    obj.examination.artifacts[key].remove(len(obj.examination.RR_intervals))
-
-        for key in obj.examination.artifacts.keys():
-            for i in idx:
-                if i in obj.examination.artifacts[key]:
-                    obj.examination.artifacts[key].remove(i)
-        
-        return deleted
-    else:
-        return np.array([])
-
+    if not to_correct.any():
+        return np.array([], dtype=int)
+
+    exam.RR[to_correct] = np.nan
+    RR_with_nan = exam.RR.copy()
+    inds = np.arange(n)
+    nan_inds = inds[to_correct]
+    keep = np.ones(n, dtype=bool)
+    progress(10)
+
+    # Correct with linear interpolation
+    if method == "linear interpolation":
+        exam.RR[nan_inds] = _interpolate_linear(RR_with_nan, nan_inds)
+        exam.corrections[nan_inds, CORRECTION_METHODS.index(method)] += 1
+
+    # Correct with cubic splain
+    elif method == "cubic splain":
+        from scipy import interpolate
+        f = interpolate.CubicSpline(inds[~to_correct], RR_with_nan[~to_correct])
+        exam.RR[nan_inds] = f(nan_inds)
+        exam.corrections[nan_inds, CORRECTION_METHODS.index(method)] += 1
+
+    elif method == "deletion":
+        keep = ~to_correct
+
+    # Correct with moving average of 4 windows of 4 samples around the artifact
+    elif method == "moving average":
+        # Check if the probe has 3 probes before and after it
+        val = nan_inds[(nan_inds >= 3) & (nan_inds <= n - 3)]
+        padded = np.append(RR_with_nan, np.nan)
+        neighborhood = padded[val[:, None] + np.arange(-3, 4)]
+        with warnings.catch_warnings():
+            # Windows consisting only of artifacts give NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            temp_means = np.nanmean(np.lib.stride_tricks.sliding_window_view(neighborhood, 4, axis=1), axis=2)
+        exam.RR[val] = temp_means.mean(axis=1)
+        exam.corrections[val, CORRECTION_METHODS.index(method)] += 1
+
+    # Correct with a mean of pre_mean_count previous samples
+    elif method == "pre mean":
+        val = nan_inds[nan_inds >= pre_mean_count]
+        neighborhood = RR_with_nan[val[:, None] + np.arange(-pre_mean_count, 0)]
+        exam.RR[val] = neighborhood.mean(axis=1)
+        exam.corrections[val, CORRECTION_METHODS.index(method)] += 1
+
+    # if any nans left (probes without enough neighbours or with artifacts in their neighbourhood) - interpolate
+    if method in ("moving average", "pre mean"):
+        left = np.flatnonzero(np.isnan(exam.RR))
+        exam.RR[left] = _interpolate_linear(exam.RR, left)
+        exam.corrections[left, CORRECTION_METHODS.index("linear interpolation")] += 1
+
+    progress(90)
+
+    # Remove NANs from the beggining and the end of examination - those values could not be interpolated
+    finite = np.flatnonzero(~np.isnan(exam.RR) & keep)
+    keep[:finite[0] if len(finite) > 0 else n] = False
+    if len(finite) > 0:
+        keep[finite[-1] + 1:] = False
+
+    # Corrected intervals are no longer artifacts
+    exam.artifact_mask[to_correct] = 0
+    exam.keep(keep)
+
+    return inds[~keep]
+
+def _interpolate_linear(RR, inds):
+    '''
+    Linear interpolation of RR at inds based on its finite values; NaN outside of them
+    '''
+    finite = np.flatnonzero(~np.isnan(RR))
+    return np.interp(inds, finite, RR[finite], left=np.nan, right=np.nan)
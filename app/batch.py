@@ -0,0 +1,181 @@
+"""
+Headless batch processing of RR recordings.
+
+Runs artifact detection, correction and HRV analysis for every recording in a
+directory and writes the cleaned series and stats files in the same form as
+the Save button of the application.
+
+usage: python batch.py INPUT_DIR PARAMS_FILE [-o OUTPUT_DIR] [-j JOBS]
+
+PARAMS_FILE is a JSON file, e.g.:
+{
+    "detectors": ["Tarvainen", "T1", "T2", "T3"],
+    "correct": ["Tarvainen", "T1"],
+    "method": "cubic splain",
+    "T1": 200, "T2": 400, "T3": 400,
+    "pre_mean_count": 4,
+    "stationarity": "adf-fixed"
+}
+Missing keys take the defaults of the application.
+"""
+import argparse
+import json
+import os
+import sys
+import warnings
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from artifacts import correct_artifacts
+from detectors import (DETECTORS, TarvainenParams, T1Params, T2Params, T3Params,
+                       run_detectors)
+from examination import Examination
+from export import export, EXPORT_FORMATS
+from hrv import compute_hrv, create_hrv_summary, STATIONARITY_MODES
+import timing
+
+EXTENSIONS = ('txt', 'csv', 'xls', 'xlsx')
+# Files written by process_file, skipped when listing recordings
+OUTPUT_SUFFIXES = tuple(f"_clean.{fmt}" for fmt in EXPORT_FORMATS) + ("_clean_stats.txt",)
+
+DEFAULT_PARAMS = {
+    "detectors": ["Tarvainen", "Quotient", "Square", "T1", "T2", "T3"],
+    "correct": None,  # same as detectors
+    "method": "linear interpolation",
+    "T1": 200,
+    "T2": 400,
+    "T3": 400,
+    "pre_mean_count": 4,
+    "tarvainen": {},
+    "stationarity": "adf-fixed",
+    # Sheet and column (name or index) of csv and Excel files, None for the default one
+    "sheet": None,
+    "column": None,
+    # Format of the cleaned series, one of EXPORT_FORMATS
+    "format": "txt",
+    # Number of templates SampEn and ApEn are estimated from, None to count them exactly
+    "entropy_templates": None,
+}
+
+METHODS = ("linear interpolation", "cubic splain", "deletion", "moving average", "pre mean")
+
+
+def load_params(path):
+    """
+    Read parameters file and fill missing values with defaults
+    """
+    with open(path, 'r') as f:
+        params = dict(DEFAULT_PARAMS, **json.load(f))
+    if params["correct"] is None:
+        params["correct"] = params["detectors"]
+    unknown = set(params["detectors"]) | set(params["correct"])
+    unknown -= set(DETECTORS)
+    if unknown:
+        raise ValueError(f"Unknown artifact types: {', '.join(sorted(unknown))}")
+    if params["method"] not in METHODS:
+        raise ValueError(f"Unknown correction method: {params['method']}")
+    if params["stationarity"] not in STATIONARITY_MODES:
+        raise ValueError(f"Unknown stationarity mode: {params['stationarity']}")
+    if params["format"] not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {params['format']}")
+    templates = params["entropy_templates"]
+    if templates is not None and (not isinstance(templates, int) or templates < 1):
+        raise ValueError(f"entropy_templates must be a positive integer: {templates}")
+    return params
+
+
+def detect(examination, params):
+    """
+    Run detectors chosen in params on examination
+    """
+    detector_params = {
+        "Tarvainen": TarvainenParams(**params["tarvainen"]),
+        "T1": T1Params(params["T1"]),
+        "T2": T2Params(params["T2"], params["T1"]),
+        "T3": T3Params(params["T3"], params["T1"]),
+    }
+    selected = {atype: detector_params.get(atype) for atype in params["detectors"]}
+    found, details = run_detectors(examination.RR, selected)
+    for atype, artifacts in found.items():
+        examination.set_artifacts(atype, artifacts)
+    if "Tarvainen" in details:
+        examination.tarvainen_classes = details["Tarvainen"]
+
+
+def process_file(path, params, output_dir, use_cache=True, name=None):
+    """
+    Detect, correct and analyse single recording, writing results as
+    name_clean (by default name of the file without extension). Returns (path,
+    message, stages recorded by timing in this process since the last recording).
+    """
+    warnings.filterwarnings("ignore")
+    examination = Examination(path, use_cache=use_cache, sheet=params["sheet"], column=params["column"])
+    detect(examination, params)
+    correct_artifacts(examination, params["correct"], params["method"],
+                      0, len(examination.RR) - 1, params["pre_mean_count"])
+    hrv_params = compute_hrv(examination.RR, stationarity_mode=params["stationarity"],
+                             entropy_templates=params["entropy_templates"])
+    hrv_text = create_hrv_summary(hrv_params, show_all=True)
+
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    fname = os.path.join(output_dir, f"{name}_clean")
+    export(examination, f"{fname}.{params['format']}", params["format"])
+    examination.save_stats(f"{fname}_stats.txt", hrv_text)
+    return (path, f"{examination.original_len - len(examination.RR)} removed, {len(examination.RR)} intervals left",
+            timing.take())
+
+
+def find_recordings(input_dir):
+    """
+    List recordings with supported extensions in input_dir, without outputs of earlier runs
+    """
+    return sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir)
+                  if f.split('.')[-1].lower() in EXTENSIONS and not f.lower().endswith(OUTPUT_SUFFIXES))
+
+
+def output_names(paths):
+    """
+    Names of results of each recording: the file name without extension, with
+    the extension appended (name_csv) if other recordings have the same name
+    """
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    counts = Counter(stem.lower() for stem in stems)
+    return {path: f"{stem}_{os.path.splitext(path)[1][1:].lower()}" if counts[stem.lower()] > 1 else stem
+            for path, stem in zip(paths, stems)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect and correct artifacts in all RR recordings from a directory.")
+    parser.add_argument("input_dir", help="directory with .txt, .csv, .xls or .xlsx recordings")
+    parser.add_argument("params", help="JSON file with detection and correction parameters")
+    parser.add_argument("-o", "--output-dir", help="directory for results (default: input directory)")
+    parser.add_argument("--no-cache", action="store_true", help="always parse recordings, ignoring .rrcache sidecar files")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes (default: all CPU cores)")
+    args = parser.parse_args(argv)
+
+    params = load_params(args.params)
+    output_dir = args.output_dir or args.input_dir
+    os.makedirs(output_dir, exist_ok=True)
+    paths = find_recordings(args.input_dir)
+    if not paths:
+        print(f"No recordings found in {args.input_dir}")
+        return 1
+
+    names = output_names(paths)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(process_file, path, params, output_dir, not args.no_cache, names[path]): path
+                   for path in paths}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                path, message, stages = future.result()
+                timing.merge(stages, thread=os.path.basename(path))
+                print(f"[{done}/{len(paths)}] {os.path.basename(path)}: {message}")
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(paths)}] {os.path.basename(futures[future])}: FAILED ({e})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
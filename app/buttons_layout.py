@@ -3,6 +3,7 @@ Module responsible for buttons creation
 """
 from PyQt6.QtWidgets import QPushButton, QButtonGroup, QLabel, QHBoxLayout
 from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QKeySequence, QShortcut
 
 def create_buttons_layout(obj):
     """
@@ -41,4 +42,18 @@ def create_buttons_layout(obj):
     obj.del_btn2.clicked.connect(lambda:obj.delete_chosen_artifacts())
     obj.c_buttons_layout.addWidget(obj.del_btn2)
 
+    # Undo and redo of detections and corrections (also Ctrl+Z, Ctrl+Shift+Z)
+    obj.undo_btn = QPushButton(obj)
+    obj.undo_btn.setText("Undo")
+    obj.undo_btn.clicked.connect(lambda:obj.undo())
+    obj.c_buttons_layout.addWidget(obj.undo_btn)
+    obj.redo_btn = QPushButton(obj)
+    obj.redo_btn.setText("Redo")
+    obj.redo_btn.clicked.connect(lambda:obj.redo())
+    obj.c_buttons_layout.addWidget(obj.redo_btn)
+    obj.undo_shortcut = QShortcut(QKeySequence.StandardKey.Undo, obj)
+    obj.undo_shortcut.activated.connect(obj.undo)
+    obj.redo_shortcut = QShortcut(QKeySequence.StandardKey.Redo, obj)
+    obj.redo_shortcut.activated.connect(obj.redo)
+
 
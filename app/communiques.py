@@ -40,4 +40,15 @@ T2: identified as an interval too short taking into consideration previous sampl
     # moving average
     obj.m4.setToolTip("Correction with a moving average algorithm with a window of length 7.")
     # pre mean
-    obj.m5.setToolTip("Correction by replacing the artifact with a mean of few last samples defined by user.")
\ No newline at end of file
+    obj.m5.setToolTip("Correction by replacing the artifact with a mean of few last samples defined by user.")
+    # Sheet and column of csv and Excel files
+    obj.sheet_textbox.setToolTip("Sheet of an Excel file to read RR intervals from: name or number counted from 0. The first sheet if empty.")
+    obj.column_textbox.setToolTip("Column to read RR intervals from: header or number counted from 0 (negative from the end). The first column of Excel files and the last column of csv files if empty.")
+
+    # Workspace
+    obj.recordings_combo.setToolTip("Recordings open at the same time - detections, corrections and undo history are kept for each of them.")
+    obj.close_btn.setToolTip("Close the current recording.")
+
+    # Undo and redo
+    obj.undo_btn.setToolTip("Undo the last detection, manual change or correction (Ctrl+Z).")
+    obj.redo_btn.setToolTip("Redo the last undone change (Ctrl+Shift+Z).")
@@ -0,0 +1,99 @@
+"""
+Module responsible for level-of-detail decimation of the RR signal plot and
+spatial queries (nearest beat, beats in a rectangle) on it
+"""
+import heapq
+
+import numpy as np
+
+
+class MinMaxPyramid():
+    """
+    Multi-resolution min/max summary of a signal. Level L keeps, for every block
+    of 2**L consecutive samples, positions of its minimum and maximum, so a view
+    of any range can be drawn with a bounded number of points without losing
+    peaks.
+    """
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=float)
+        self.min_idx = [np.arange(len(self.values))]
+        self.max_idx = [self.min_idx[0]]
+        while len(self.min_idx[-1]) > 1:
+            self.min_idx.append(self._reduce(self.min_idx[-1], np.less_equal))
+            self.max_idx.append(self._reduce(self.max_idx[-1], np.greater_equal))
+
+    def _reduce(self, idx, keep_first):
+        """
+        Combine pairs of blocks of the previous level
+        """
+        if len(idx) % 2 == 1:
+            idx = np.append(idx, idx[-1])
+        first, second = idx[0::2], idx[1::2]
+        return np.where(keep_first(self.values[first], self.values[second]), first, second)
+
+    def __len__(self):
+        return len(self.values)
+
+    def visible(self, x_start, x_stop, max_points):
+        """
+        Positions and values to draw for samples between x_start and x_stop with
+        at most about max_points points. Returns (x, y) arrays.
+        """
+        start = int(np.clip(np.floor(x_start), 0, len(self.values)))
+        stop = int(np.clip(np.ceil(x_stop) + 1, start, len(self.values)))
+        n_samples = stop - start
+        max_points = max(int(max_points), 2)
+        if n_samples <= max_points:
+            x = np.arange(start, stop)
+            return x, self.values[x]
+
+        # Each block gives two points (its minimum and maximum)
+        level = min(int(np.ceil(np.log2(2 * n_samples / max_points))), len(self.min_idx) - 1)
+        block_start = start >> level
+        block_stop = ((stop - 1) >> level) + 1
+        mins = self.min_idx[level][block_start:block_stop]
+        maxs = self.max_idx[level][block_start:block_stop]
+        # Keep the order of extremes within each block to preserve the shape
+        x = np.column_stack([np.minimum(mins, maxs), np.maximum(mins, maxs)]).ravel()
+        return x, self.values[x]
+
+    def _block_distance(self, level, block, x, y, scale_x, scale_y):
+        """
+        Squared screen distance from (x, y) to bounding box of a block
+        """
+        x_first = block << level
+        x_last = min((block + 1) << level, len(self.values)) - 1
+        y_min = self.values[self.min_idx[level][block]]
+        y_max = self.values[self.max_idx[level][block]]
+        dx = max(x_first - x, 0, x - x_last) * scale_x
+        dy = max(y_min - y, 0, y - y_max) * scale_y
+        return dx * dx + dy * dy
+
+    def nearest(self, x, y, scale_x=1.0, scale_y=1.0):
+        """
+        Index of the sample nearest to point (x, y) when x and y distances are
+        multiplied by scale_x and scale_y (e.g. pixels per unit), or None for an
+        empty signal. Blocks are visited best-first by distance to their
+        bounding boxes, so only a few blocks per level are checked.
+        """
+        if len(self.values) == 0:
+            return None
+        top = len(self.min_idx) - 1
+        heap = [(self._block_distance(top, 0, x, y, scale_x, scale_y), top, 0)]
+        while True:
+            _, level, block = heapq.heappop(heap)
+            if level == 0:
+                return block
+            for child in (2 * block, 2 * block + 1):
+                if child < len(self.min_idx[level - 1]):
+                    distance = self._block_distance(level - 1, child, x, y, scale_x, scale_y)
+                    heapq.heappush(heap, (distance, level - 1, child))
+
+    def select(self, x_start, x_stop, y_min, y_max):
+        """
+        Indices of samples inside the rectangle [x_start, x_stop] x [y_min, y_max]
+        """
+        start = int(np.clip(np.ceil(x_start), 0, len(self.values)))
+        stop = int(np.clip(np.floor(x_stop) + 1, start, len(self.values)))
+        values = self.values[start:stop]
+        return start + np.flatnonzero((values >= y_min) & (values <= y_max))
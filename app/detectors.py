@@ -0,0 +1,359 @@
+"""
+Module responsible for the registry of artifact detectors.
+
+Every detector is a pure function of the RR series (wrapped in DerivedSeries)
+and a parameter dataclass returning sorted indices of artifacts. Series
+derived from RR (differences, ratios, rolling medians) are counted once per
+DerivedSeries and shared by all detectors run on it.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from timing import stage
+
+# Tarvainen artifact classes, in the order they are returned by the Tarvainen detector
+TARVAINEN_CLASSES = ("extra", "missed", "ectopic", "longshort")
+
+
+@dataclass
+class TarvainenParams:
+    c1: float = 0.13
+    c2: float = 0.17
+    alpha: float = 5.2
+    window_width: int = 91
+    medfilt_order: int = 11
+
+
+@dataclass
+class T1Params:
+    # Difference between two neighbouring RRi [ms]
+    diff: float = 200
+
+
+@dataclass
+class T2Params:
+    # Long RRi before short one [ms]
+    diff: float = 400
+    # Threshold of T1 artifacts excluded from the result
+    diff_t1: float = 200
+
+
+@dataclass
+class T3Params:
+    # Short RRi before long one [ms]
+    diff: float = 400
+    # Threshold of T1 artifacts excluded from the result
+    diff_t1: float = 200
+
+
+@dataclass
+class QuotientParams:
+    pass
+
+
+@dataclass
+class SquareParams:
+    # Limits of physiological RRi [ms]
+    low: float = 300
+    high: float = 2000
+
+
+class DerivedSeries():
+    """
+    RR series with derived series counted on first use and shared by detectors.
+    Detectors call progress(percent) between their stages, if given.
+    """
+    def __init__(self, rr, progress=None):
+        self.rr = np.asarray(rr, dtype=float)
+        self._cache = {}
+        # Additional results of detectors, e.g. Tarvainen classes
+        self.details = {}
+        self.progress = progress or (lambda percent: None)
+
+    def _get(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def diff(self):
+        """
+        Differences of successive intervals
+        """
+        return self._get("diff", lambda: np.diff(self.rr))
+
+    @property
+    def ratio(self):
+        """
+        Quotients of each interval and the next one
+        """
+        return self._get("ratio", lambda: self.rr[:-1] / self.rr[1:])
+
+    @property
+    def ratio_next(self):
+        """
+        Quotients of each next interval and the current one
+        """
+        return self._get("ratio_next", lambda: self.rr[1:] / self.rr[:-1])
+
+    def rolling_median(self, order):
+        """
+        Centred rolling median of RR of given order
+        """
+        def compute():
+            import pandas as pd
+            df = pd.DataFrame({"signal": self.rr})
+            return df.rolling(order, center=True, min_periods=1).median().signal.values
+        return self._get(("rolling_median", order), compute)
+
+    def t1(self, diff):
+        """
+        Indices of T1 artifacts for threshold diff - also excluded by T2 and T3
+        """
+        return self._get(("t1", diff), lambda: t1(self, T1Params(diff)))
+
+
+def _compute_threshold(signal, alpha, window_width):
+    import pandas as pd
+    df = pd.DataFrame({"signal": np.abs(signal)})
+    q1 = (
+        df.rolling(window_width, center=True, min_periods=1)
+        .quantile(0.25)
+        .signal
+    )
+    q3 = (
+        df.rolling(window_width, center=True, min_periods=1)
+        .quantile(0.75)
+        .signal
+    )
+    th = alpha * ((q3 - q1) / 2)
+
+    return th.to_numpy()
+
+
+def classify_tarvainen(rr,
+                       c1=0.13,
+                       c2=0.17,
+                       alpha=5.2,
+                       window_width=91,
+                       medfilt_order=11,
+                       series=None):
+    """
+    Function classifying artifacts found with a Tarvainen filter. Returns dict with
+    sorted indices for each of TARVAINEN_CLASSES. series is DerivedSeries of rr
+    to take shared derived series from, if any; its progress is called between
+    the thresholds, the rolling median and the classification.
+    """
+    series = series or DerivedSeries(rr)
+    rr = series.rr
+    if len(rr) < 3:
+        return {artifact_class: np.empty(0, dtype=int) for artifact_class in TARVAINEN_CLASSES}
+    drrs = np.concatenate(([np.mean(series.diff)], series.diff))
+    th1 = _compute_threshold(drrs, alpha, window_width)
+    series.progress(30)
+    # Ignore division by 0 warning
+    old_setting = np.seterr(divide="ignore", invalid="ignore")
+    drrs /= th1
+    # Return old setting
+    np.seterr(**old_setting)
+    padding = 2
+    drrs_pad = np.pad(drrs, padding, "reflect")
+    prev1 = drrs_pad[padding - 1:padding - 1 + drrs.size]
+    next1 = drrs_pad[padding + 1:padding + 1 + drrs.size]
+    next2 = drrs_pad[padding + 2:padding + 2 + drrs.size]
+
+    # Cast dRRs to subspace s12.
+    s12 = np.where(drrs > 0, np.maximum(prev1, next1),
+                   np.where(drrs < 0, np.minimum(prev1, next1), 0))
+    # Cast dRRs to subspace s22.
+    s22 = np.where(drrs >= 0, np.minimum(next1, next2),
+                   np.where(drrs < 0, np.maximum(next1, next2), 0))
+    # Compute mRRs: time series of deviation of RRs from median.
+    medrr = series.rolling_median(medfilt_order)
+    series.progress(50)
+    mrrs = rr - medrr
+    mrrs[mrrs < 0] = mrrs[mrrs < 0] * 2
+    # Normalize by threshold.
+    th2 = _compute_threshold(mrrs, alpha, window_width)
+    mrrs /= th2
+    series.progress(80)
+
+    # Beats checked by the detector; the last two beats are only used as neighbours
+    m = max(len(rr) - 2, 0)
+    absd = np.abs(drrs)
+    suspicious = ~(absd[:m] <= 1)
+    # Ectopic beats.
+    eq1 = np.logical_and(drrs > 1, s12 < (-c1 * drrs - c2))
+    eq2 = np.logical_and(drrs < -1, s12 > (-c1 * drrs + c2))
+    ectopic = suspicious & (eq1 | eq2)[:m]
+    # Beats evaluated as long/short candidates.
+    longshort_check = suspicious & ~ectopic & ((absd > 1) | (np.abs(mrrs) > 3))[:m]
+    # The following beat is evaluated together with the current one...
+    pair = longshort_check & (absd[1:m + 1] < absd[2:m + 2])
+    # ...and then skipped, so within a run of pairs every second beat is visited.
+    run_start = np.where(pair & ~np.r_[False, pair[:-1]], np.arange(m), 0)
+    offset = np.arange(m) - np.maximum.accumulate(run_start) if m > 0 else np.empty(0, dtype=int)
+    visited = np.ones(m, dtype=bool)
+    visited[1:] = ~(pair[:-1] & (offset[:-1] % 2 == 0))
+
+    candidates = np.zeros(m + 1, dtype=bool)
+    candidates[:m] = visited & longshort_check
+    candidates[1:] |= visited & pair
+    j = np.arange(m + 1)
+    # Long beat.
+    eq3 = np.logical_and(drrs[j] > 1, s22[j] < -1)
+    # Long or short.
+    eq4 = np.abs(mrrs[j]) > 3
+    # Short beat.
+    eq5 = np.logical_and(drrs[j] < -1, s22[j] > 1)
+    abnormal = candidates & (eq3 | eq4 | eq5)
+    # Missing.
+    eq6 = np.abs(rr[j] / 2 - medrr[j]) < th2[j]  # Figure 1
+    # Extra.
+    eq7 = np.abs(rr[j] + rr[j + 1] - medrr[j]) < th2[j]  # Figure 1
+
+    extra = abnormal & eq5 & eq7
+    missed = abnormal & ~extra & eq3 & eq6
+    # If neither classified as extra or missing, classify as "long or short".
+    longshort = abnormal & ~extra & ~missed
+
+    return {"extra": np.flatnonzero(extra),
+            "missed": np.flatnonzero(missed),
+            "ectopic": np.flatnonzero(visited & ectopic),
+            "longshort": np.flatnonzero(longshort)}
+
+
+def tarvainen(series, params):
+    """
+    Artifacts found with a Tarvainen filter; their classes are stored in series.details
+    """
+    classes = classify_tarvainen(series.rr, params.c1, params.c2, params.alpha,
+                                 params.window_width, params.medfilt_order, series=series)
+    series.details["Tarvainen"] = classes
+    return np.unique(np.concatenate([classes[artifact_class] for artifact_class in TARVAINEN_CLASSES]))
+
+
+def t1(series, params):
+    """
+    Artifacts type T1 defined by Giles
+    """
+    rr = series.rr
+    big = (np.abs(series.diff) > params.diff).astype(int)
+    # count differences between this and previous interval
+    d_prev = np.insert(big, 0, 0)
+    # count differences between this and next interval
+    d_next = np.insert(big, len(big) - 1, 0)
+
+    final_list = d_prev + d_next
+    #check for last interval
+    if abs(rr[-1] - rr[-2]) > params.diff:
+        final_list[-1] = 2
+
+    return np.where(final_list == 2)[0]
+
+
+def t2(series, params):
+    """
+    Artifacts type T2 defined by Giles, without artifacts of type T1 (found with diff_t1)
+    """
+    rr = series.rr
+    # count differences between this and previous interval
+    d_next = (-series.diff > params.diff).astype(int)
+    d_next = np.insert(d_next, len(d_next) - 1, 0)
+    # check for last sample
+    if rr[-2] - rr[-1] > params.diff:
+        d_next[-1] = 1
+
+    idx = np.where(d_next == 1)[0]
+    return _exclude(idx, series.t1(params.diff_t1), len(rr))
+
+
+def t3(series, params):
+    """
+    Artifacts type T3 defined by Giles, without artifacts of type T1 (found with diff_t1)
+    """
+    rr = series.rr
+    # count differences between this and previous interval (the first interval is compared with the last one)
+    d_next = (np.concatenate(([rr[-1] - rr[0]], -series.diff[:-1])) > params.diff).astype(int)
+    d_next = np.insert(d_next, len(d_next) - 1, 0)
+    # check for last sample
+    if rr[-1] - rr[-2] > params.diff:
+        d_next[-1] = 1
+    idx = np.where(d_next == 1)[0]
+    return _exclude(idx, series.t1(params.diff_t1), len(rr))
+
+
+def _exclude(idx, excluded, n):
+    """
+    Indices from idx that are not in excluded
+    """
+    mask = np.zeros(n, dtype=bool)
+    mask[excluded] = True
+    return idx[~mask[idx]]
+
+
+def _with_previous(indices):
+    """
+    Sorted indices together with the indices preceding them
+    """
+    indices = np.concatenate((indices, indices - 1))
+    return np.unique(indices[indices >= 0])
+
+
+def quotient(series, params):
+    """
+    Artifacts found with Piskorski-Guzik quotient filter
+    """
+    x = series.rr
+    L = len(x) - 1
+    condition1 = series.ratio < 0.8
+    condition2 = x[:L] / x[:L] > 1.2
+    condition3 = series.ratio_next < 0.8
+    condition4 = series.ratio_next > 1.2
+
+    indices_p = np.where(condition1 | condition2 | condition3 | condition4)[0]
+    return _with_previous(indices_p)
+
+
+def square(series, params):
+    """
+    Artifacts found with Piskorski-Guzik square filter
+    """
+    x = series.rr
+    L = len(x) - 1
+    indices = np.where((x[:L] < params.low) | (x[:L] > params.high))[0]
+    return _with_previous(indices)
+
+
+# Artifact type -> (detector, its parameters dataclass)
+DETECTORS = {
+    "Tarvainen": (tarvainen, TarvainenParams),
+    "Quotient": (quotient, QuotientParams),
+    "Square": (square, SquareParams),
+    "T1": (t1, T1Params),
+    "T2": (t2, T2Params),
+    "T3": (t3, T3Params),
+}
+
+
+def run_detectors(rr, selected, progress=None):
+    """
+    Run detectors of artifact types in selected (dict: artifact type -> parameters,
+    None for defaults) on rr, sharing derived series between them.
+    progress(percent) is called between the detectors and their stages, if given.
+    Returns (dict: artifact type -> indices, dict of details, e.g. Tarvainen classes).
+    """
+    series = rr if isinstance(rr, DerivedSeries) else DerivedSeries(rr)
+    progress = progress or series.progress
+    found = {}
+    for i, (atype, params) in enumerate(selected.items()):
+        # Percent of the detector scaled to its share of all detectors
+        series.progress = lambda percent, i=i: progress((i + percent / 100) * 100 / len(selected))
+        series.progress(0)
+        detector, params_class = DETECTORS[atype]
+        with stage(atype, len(series.rr)):
+            found[atype] = detector(series, params if params is not None else params_class())
+    series.progress = progress
+    progress(100)
+    return found, series.details
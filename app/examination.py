@@ -1,79 +1,302 @@
 """
 Examination Class
 """
+import copy
 import numpy as np
-from interval import Interval
+from interval import ARTIFACT_TYPES, ARTIFACT_BITS, NO_ARTIFACT, CORRECTION_METHODS
 import re
-import pandas as pd
-import openpyxl
+import rr_cache
+from export import export, summary
+from timing import timed
+
+def parse_numeric_lines(data):
+    """
+    Parse integer parts of lines containing a single non-negative number (e.g. "812" or
+    "812.5") from raw file contents in one vectorized pass over its bytes.
+    Returns array of values and number of rejected non-empty lines.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if len(buf) == 0 or buf[-1] not in (10, 13):
+        buf = np.append(buf, np.uint8(10))
+    newline = (buf == 10) | (buf == 13)
+    ends = np.flatnonzero(newline)
+    is_dot = buf == 46
+    token = ((buf >= 48) & (buf <= 57)) | is_dot
+    space = (buf == 32) | (buf == 9) | (buf == 11) | (buf == 12)
+
+    # Runs of digits and dots - a valid line contains exactly one of them
+    run_start = np.flatnonzero(token[1:] & ~token[:-1]) + 1
+    if token[0]:
+        run_start = np.r_[0, run_start]
+    run_end = np.flatnonzero(token[:-1] & ~token[1:]) + 1
+    run_line = np.searchsorted(ends, run_start)
+    n_runs = np.bincount(run_line, minlength=len(ends))
+    first = np.zeros(len(ends), dtype=np.int64)
+    last = np.zeros(len(ends), dtype=np.int64)
+    first[run_line] = run_start
+    last[run_line] = run_end
+
+    # Lines with any other character (letters, signs, separators) are rejected
+    has_other = np.zeros(len(ends), dtype=bool)
+    has_other[np.searchsorted(ends, np.flatnonzero(~(token | space | newline)))] = True
+    dots = np.flatnonzero(is_dot)
+    dot_line = np.searchsorted(ends, dots)
+    n_dots = np.bincount(dot_line, minlength=len(ends))
+
+    valid = (n_runs == 1) & ~has_other & (n_dots <= 1) & (last - first > n_dots)
+    rejected = int(np.count_nonzero((n_runs > 0) | has_other) - np.count_nonzero(valid))
+
+    # Integer part ends at the dot, if there is one
+    int_end = last
+    single_dot = n_dots[dot_line] == 1
+    int_end[dot_line[single_dot]] = dots[single_dot]
+    first, length = first[valid], int_end[valid] - first[valid]
+    values = np.zeros(len(first))
+    for k in range(length.max() if len(length) > 0 else 0):
+        more = length > k
+        values[more] = values[more] * 10 + (buf[first[more] + k] - 48)
+    return values, rejected
+
+def selector(text):
+    """
+    Sheet or column selector typed by the user: index if text is an integer
+    (negative counts from the end), name otherwise, None (default) if empty
+    """
+    text = text.strip()
+    if not text:
+        return None
+    return int(text) if re.fullmatch(r"-?\d+", text) else text
+
+def _column_index(header, column):
+    """
+    Index of column (name or index) among the names in header row
+    """
+    header = list(header)
+    if isinstance(column, str):
+        if column not in header:
+            raise ValueError(f"Column {column!r} not found.")
+        return header.index(column)
+    if not -len(header) <= column < len(header):
+        raise ValueError(f"Column {column} not found - there are {len(header)} columns.")
+    return column % len(header)
+
+def _pandas_has_calamine():
+    """
+    True if the installed pandas can read Excel files with calamine (since 2.2)
+    """
+    import pandas as pd
+    major, minor = (int(part) for part in pd.__version__.split(".")[:2])
+    return (major, minor) >= (2, 2)
+
+def read_excel_column(path, sheet=None, column=None):
+    """
+    Values of a single column (by default the first one) of a single sheet (by
+    default the first one) of an Excel file. The first row is the header.
+    .xlsx files are streamed in read-only mode, so other sheets and columns
+    are never parsed (unless the faster calamine engine is installed).
+    """
+    import importlib.util
+    sheet = 0 if sheet is None else sheet
+    column = 0 if column is None else column
+    calamine = importlib.util.find_spec("python_calamine") is not None and _pandas_has_calamine()
+    if calamine or path.lower().endswith('.xls'):
+        # Legacy format is not supported by openpyxl; calamine reads a whole
+        # sheet faster than openpyxl streams a single column
+        import pandas as pd
+        df = pd.read_excel(path, sheet_name=sheet, engine="calamine" if calamine else None)
+        values = df.iloc[:, _column_index(df.columns, column)]
+        return values.dropna().to_numpy(dtype=float)
+
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        if not workbook.sheetnames:
+            raise ValueError("No worksheets found in the Excel file.")
+        if isinstance(sheet, str) and sheet not in workbook.sheetnames:
+            raise ValueError(f"Sheet {sheet!r} not found.")
+        if isinstance(sheet, int) and not -len(workbook.sheetnames) <= sheet < len(workbook.sheetnames):
+            raise ValueError(f"Sheet {sheet} not found - there are {len(workbook.sheetnames)} sheets.")
+        worksheet = workbook[sheet] if isinstance(sheet, str) else workbook.worksheets[sheet]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, ())
+        index = _column_index(header, column)
+        rows = worksheet.iter_rows(min_row=2, min_col=index + 1, max_col=index + 1, values_only=True)
+        return np.array([value for value, in rows if value is not None], dtype=float)
+    finally:
+        workbook.close()
+
+def read_csv_column(path, column=None):
+    """
+    Values of a single column (by default the last one) of a csv file. Only
+    this column is parsed, with the pyarrow engine if it is installed.
+    """
+    import importlib.util
+    import pandas as pd
+    column = -1 if column is None else column
+    header = pd.read_csv(path, nrows=0).columns
+    index = _column_index(header, column)
+    engine = "pyarrow" if importlib.util.find_spec("pyarrow") is not None else "c"
+    df = pd.read_csv(path, usecols=[index], engine=engine)
+    return df.iloc[:, 0].dropna().to_numpy(dtype=float)
 
 class Examination():
-    def __init__(self, path=None):
+    def __init__(self, path=None, use_cache=True, sheet=None, column=None):
         self.path = path
+        # Sheet and column (name or index) the RR intervals are read from
+        # in csv and Excel files; None selects the default one
+        self.sheet = sheet
+        self.column = column
+        # Number of lines skipped while reading the file
+        self.rejected_lines = 0
         if self.path == None:
-            #self.RR = []
             self.t = []
             self.duration = 0
             self.extension = ''
-            self.original_len = 0
+            RR = np.empty(0)
 
         else:
-            self.extension = self.path.split('.')[-1]
-            self.RR_intervals = [Interval(int(RR)) for RR in self.get_RR_intervals()]
-            self.original_len = len(self.RR_intervals)
-            self.artifacts = {"Tarvainen": [],
-                            "Quotient": [],
-                            "Square": [],
-                            "T1": [],
-                            "T2": [],
-                            "T3": [],
-                            "Manual": []}
-        
-    def get_RR_intervals(self):
-        if self.extension == 'txt':
-            intervals = []
-            with open(self.path, 'r') as file:
-                for line in file:
-                    line = line.strip()
-                    if all(char.isdigit() or char == '.' for char in line):
-                        if len(line) > 0:
-                            intervals.append(int(float(line)))
-                list_int = np.array(intervals)
+            self.extension = self.path.split('.')[-1].lower()
+            cached = rr_cache.load(self.path, **self.read_params()) if use_cache else None
+            if cached is not None:
+                RR, meta = cached
+                self.rejected_lines = meta["rejected_lines"]
+            else:
+                # RR intervals are stored in whole milliseconds, as in the source files
+                RR = np.trunc(np.asarray(self.get_RR_intervals(), dtype=float))
+                if use_cache:
+                    rr_cache.store(self.path, RR, self.rejected_lines, **self.read_params())
 
-        elif self.extension in ['xls', 'xlsx'] :
-            df = pd.read_excel(self.path, sheet_name=None)
+        # Columnar storage: one entry per RR interval
+        self.RR = RR
+        self.artifact_type = np.full(len(RR), NO_ARTIFACT, dtype=np.int8)
+        self.corrections = np.zeros((len(RR), len(CORRECTION_METHODS)), dtype=np.int32)
+        # One bit per artifact type the interval was found with (see ARTIFACT_BITS)
+        self.artifact_mask = np.zeros(len(RR), dtype=np.uint8)
+        self.original_len = len(RR)
+        # Increased on every change of the signal
+        self.version = 0
+        # Class breakdown of the last Tarvainen detection
+        self.tarvainen_classes = {}
+        # p-values of stationarity tests: (version, mode) -> p-value
+        self.stationarity = {}
 
-            # Check if there are any worksheets in the Excel file
-            if not df:
-                raise ValueError("No worksheets found in the Excel file.")
+    def __len__(self):
+        return len(self.RR)
 
-            # Assuming the data is in the first column of the first sheet
-            first_sheet_name = list(df.keys())[0]
-            first_column_name = df[first_sheet_name].columns[0]
+    def _valid_indices(self, indices):
+        indices = np.asarray(indices, dtype=int).ravel()
+        return indices[(indices >= 0) & (indices < len(self.RR))]
 
-            # Extract values from the first column of the first sheet
-            list_int = np.array(df[first_sheet_name][first_column_name].dropna().astype(float).tolist())
+    def artifact_indices(self, atype):
+        """
+        Sorted indices of intervals found as artifacts of given type
+        """
+        return np.flatnonzero(self.artifact_mask & ARTIFACT_BITS[atype])
 
-        elif self.extension == 'csv':
-            df = pd.read_csv(self.path)
+    def flagged(self, atypes=ARTIFACT_TYPES):
+        """
+        Mask of intervals found as artifacts of any of given types
+        """
+        bits = np.uint8(sum(ARTIFACT_BITS[atype] for atype in atypes))
+        return (self.artifact_mask & bits) != 0
+
+    def set_artifacts(self, atype, indices):
+        """
+        Replace artifacts of given type with intervals under indices
+        """
+        self.artifact_mask &= np.uint8(~ARTIFACT_BITS[atype] & 0xFF)
+        self.add_artifacts(atype, indices)
+
+    def add_artifacts(self, atype, indices):
+        """
+        Mark intervals under indices as artifacts of given type
+        """
+        self.artifact_mask[self._valid_indices(indices)] |= np.uint8(ARTIFACT_BITS[atype])
 
-            # Assuming the data is in the last column, you can modify accordingly
-            last_column_name = df.columns[-1]
+    def clear_artifacts(self, indices=None, atypes=ARTIFACT_TYPES):
+        """
+        Unmark intervals under indices (all intervals if None) as artifacts of given types
+        """
+        bits = np.uint8(~sum(ARTIFACT_BITS[atype] for atype in atypes) & 0xFF)
+        if indices is None:
+            self.artifact_mask &= bits
+        else:
+            self.artifact_mask[self._valid_indices(indices)] &= bits
+
+    def copy(self):
+        """
+        Copy of examination not sharing per-interval arrays with it
+        """
+        other = copy.copy(self)
+        other.RR = self.RR.copy()
+        other.artifact_type = self.artifact_type.copy()
+        other.corrections = self.corrections.copy()
+        other.artifact_mask = self.artifact_mask.copy()
+        other.tarvainen_classes = dict(self.tarvainen_classes)
+        other.stationarity = dict(self.stationarity)
+        return other
+
+    def keep(self, mask):
+        """
+        Compact all per-interval arrays to the intervals selected by mask
+        """
+        self.RR = self.RR[mask]
+        self.artifact_type = self.artifact_type[mask]
+        self.corrections = self.corrections[mask]
+        self.artifact_mask = self.artifact_mask[mask]
+        self.version += 1
+
+    def read_params(self):
+        """
+        Options of reading the file - the cache is valid only for the same ones
+        """
+        if self.extension in ['xls', 'xlsx']:
+            return {"sheet": self.sheet, "column": self.column}
+        if self.extension == 'csv':
+            return {"column": self.column}
+        return {}
+
+    @timed("parse")
+    def get_RR_intervals(self):
+        if self.extension == 'txt':
+            with open(self.path, 'rb') as file:
+                list_int, self.rejected_lines = parse_numeric_lines(file.read())
+
+        elif self.extension in ['xls', 'xlsx']:
+            list_int = read_excel_column(self.path, self.sheet, self.column)
 
-            # Extract values from the last column
-            list_int = np.array(df[last_column_name].dropna().astype(float).tolist())
+        elif self.extension == 'csv':
+            list_int = read_csv_column(self.path, self.column)
 
+        else:
+            raise ValueError("Unsupported file type")
 
         return list_int
 
     def save_to_txt(self, path=None, range=None):
         if path == None:
             path = f"{self.path[:-4]}_noartifacts.{self.extension}"
-        if range == None:
-            with open(f"{path}", "w") as txt_file:
-                for el in self.RR_intervals:
-                    txt_file.write(f"{el.value}" + "\n")
-        else:
-            with open(f"{path}", "w") as txt_file:
-                for el in self.RR_intervals[range[0]:range[1]]:
-                    txt_file.write(f"{el.value}" + "\n")
\ No newline at end of file
+        start, stop = (None, None) if range == None else range
+        export(self, path, "txt", start, stop)
+
+    def save_stats(self, path, hrv_text):
+        """
+        Save summary of the correction applied together with HRV parameters
+        """
+        counts = summary(self)
+        with open(path, 'w') as f:
+            f.write(f"number of removed artifacts: {counts['removed']}\n")
+            f.write(f"number of corrected artifacts: {counts['corrected']}\n")
+
+            for key, total_sum in counts["methods"].items():
+                f.write("Count for %s: %s\n" % (key, total_sum))
+
+            for artifact, total_sum in counts["artifacts"].items():
+                if total_sum > 0:
+                    f.write(f"Count for {artifact}: {total_sum}\n")
+
+            for artifact_class, count in counts["tarvainen_classes"].items():
+                f.write(f"Tarvainen {artifact_class} beats detected: {count}\n")
+
+            f.write("\nHRV parameters:\n")
+            f.write(hrv_text)
@@ -0,0 +1,126 @@
+"""
+Module responsible for exporting corrected recordings.
+
+The series is written in bulk as txt (one interval per line, as before),
+csv, npz or parquet. Tabular formats hold one row per beat with the artifact
+type it was corrected as, artifact types it is still marked with and the
+number of corrections of each method. Parquet needs pyarrow or fastparquet.
+"""
+import os
+
+import numpy as np
+
+from interval import ARTIFACT_TYPES, ARTIFACT_BITS, NO_ARTIFACT, CORRECTION_METHODS
+
+EXPORT_FORMATS = ("txt", "csv", "npz", "parquet")
+
+
+def export_format(path, default="txt"):
+    """
+    Format chosen by extension of path (default if it is not an export format)
+    """
+    extension = os.path.splitext(path)[1][1:].lower()
+    return extension if extension in EXPORT_FORMATS else default
+
+
+def _text_column(values):
+    """
+    Text of each value of a bool or integer column; small non-negative
+    integers are looked up instead of formatted one by one
+    """
+    if values.dtype == bool:
+        values = values.view(np.uint8)
+    if len(values) > 0 and values.min() >= 0 and values.max() < 4096:
+        return np.array(list(map(str, range(int(values.max()) + 1))), dtype=object)[values]
+    return np.array(list(map(str, values.tolist())), dtype=object)
+
+
+def format_values(values):
+    """
+    Text of each RR interval - integers without a fractional part, other values
+    as Python prints them
+    """
+    values = np.asarray(values, dtype=float)
+    whole = np.isfinite(values) & (values == np.trunc(values))
+    text = np.empty(len(values), dtype=object)
+    text[whole] = _text_column(values[whole].astype(np.int64))
+    text[~whole] = list(map(repr, values[~whole].tolist()))
+    return text
+
+
+def summary(exam):
+    """
+    Counts of removed and corrected intervals, corrections of each method,
+    intervals corrected as each artifact type and Tarvainen classes
+    """
+    # Intervals which were never corrected have code NO_ARTIFACT = -1
+    by_type = np.bincount(exam.artifact_type.astype(np.int64) - NO_ARTIFACT,
+                          minlength=len(ARTIFACT_TYPES) + 1)[1:]
+    # Only corrected intervals have non-zero correction counts
+    by_method = exam.corrections.sum(axis=0)
+    return {"removed": exam.original_len - len(exam.RR),
+            "corrected": int(by_type.sum()),
+            "methods": dict(zip(CORRECTION_METHODS, by_method.tolist())),
+            "artifacts": dict(zip(ARTIFACT_TYPES, by_type.tolist())),
+            "tarvainen_classes": {artifact_class: len(indices)
+                                  for artifact_class, indices in exam.tarvainen_classes.items()}}
+
+
+def _column_name(name):
+    return name.lower().replace(" ", "_")
+
+
+def beat_table(exam, start=None, stop=None):
+    """
+    Columns of per-beat data of intervals start:stop
+    """
+    part = slice(start, stop)
+    table = {"rr": exam.RR[part], "corrected_as": exam.artifact_type[part]}
+    mask = exam.artifact_mask[part]
+    for atype in ARTIFACT_TYPES:
+        table[f"marked_{_column_name(atype)}"] = (mask & ARTIFACT_BITS[atype]) != 0
+    corrections = exam.corrections[part]
+    for i, method in enumerate(CORRECTION_METHODS):
+        table[_column_name(method)] = corrections[:, i]
+    return table
+
+
+def _data_frame(table):
+    import pandas as pd
+    frame = pd.DataFrame(table, copy=False)
+    frame["corrected_as"] = pd.Categorical.from_codes(table["corrected_as"], ARTIFACT_TYPES)
+    return frame
+
+
+def _write_csv(table, path):
+    """
+    Write table as csv: flags as 0/1, artifact types by name (empty if not corrected)
+    """
+    names = np.array(("",) + ARTIFACT_TYPES, dtype=object)
+    columns = [format_values(table["rr"]), names[table["corrected_as"] - NO_ARTIFACT]]
+    columns += [_text_column(values) for name, values in table.items() if name not in ("rr", "corrected_as")]
+    with open(path, "w") as f:
+        f.write(",".join(table) + "\n")
+        f.write("".join(f"{line}\n" for line in map(",".join, zip(*columns))))
+
+
+def export(exam, path, fmt=None, start=None, stop=None):
+    """
+    Write intervals start:stop of examination to path in fmt (one of
+    EXPORT_FORMATS, by default chosen by extension of path)
+    """
+    fmt = fmt or export_format(path)
+    if fmt == "txt":
+        text = format_values(exam.RR[start:stop])
+        with open(path, "w") as f:
+            f.write("\n".join(text))
+            if len(text) > 0:
+                f.write("\n")
+    elif fmt == "npz":
+        np.savez_compressed(path, artifact_types=np.array(ARTIFACT_TYPES), **beat_table(exam, start, stop))
+    elif fmt == "csv":
+        _write_csv(beat_table(exam, start, stop), path)
+    elif fmt == "parquet":
+        _data_frame(beat_table(exam, start, stop)).to_parquet(path, index=False)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
@@ -3,7 +3,27 @@ Module responsible for graph creation and modification
 """
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtGui
-import numpy as np
+
+from decimation import MinMaxPyramid
+
+class SelectionViewBox(pg.ViewBox):
+    """
+    View box emitting a rectangle (in data coordinates) dragged with Shift pressed
+    """
+    sigRectSelected = QtCore.Signal(object)
+
+    def mouseDragEvent(self, ev, axis=None):
+        shift = ev.modifiers() & QtCore.Qt.KeyboardModifier.ShiftModifier
+        if ev.button() != QtCore.Qt.MouseButton.LeftButton or not shift or axis is not None:
+            super().mouseDragEvent(ev, axis)
+            return
+        ev.accept()
+        if ev.isFinish():
+            self.rbScaleBox.hide()
+            rect = QtCore.QRectF(pg.Point(ev.buttonDownPos()), pg.Point(ev.pos()))
+            self.sigRectSelected.emit(self.childGroup.mapRectFromParent(rect).normalized())
+        else:
+            self.updateScaleBox(ev.buttonDownPos(), ev.pos())
 
 def create_graph(obj):
     """ 
@@ -20,20 +40,22 @@ def create_graph(obj):
     obj.plot_label.setLabels(left = 'RR [ms]', bottom = 'Interval number')
 
     # Initialize view item for artifacts
-    obj.plot_art = pg.ViewBox()
+    obj.plot_art = SelectionViewBox()
 
     # Initialize view item for RR signal
-    obj.p3 = pg.ViewBox()
-    obj.hrv_range = pg.ViewBox()
+    obj.p3 = SelectionViewBox()
+    obj.hrv_range = SelectionViewBox()
 
     # Initialize view item for coursor
-    obj.plot_cursor = pg.ViewBox()
+    obj.plot_cursor = SelectionViewBox()
     
     # Linking plot's axes
     for p in [obj.plot_art, obj.p3, obj.hrv_range, obj.plot_cursor]:
         obj.plot_label.scene().addItem(p)
         p.setXLink(obj.plot_label)
         p.setYLink(obj.plot_label)
+        # Shift + drag selects beats - whichever overlay gets the drag
+        p.sigRectSelected.connect(obj.select_in_rect)
 
     # Add label showing coursor coordinates
     obj.label = pg.TextItem(text="X: {} \nY: {}".format(0, 0))
@@ -50,10 +72,53 @@ def create_graph(obj):
     updateViews()
     obj.plot_label.vb.sigResized.connect(updateViews)
 
+def create_timeline(obj):
+    """
+    Create a widget showing time-domain HRV params in sliding windows under the RR signal
+    """
+    obj.timelineWidget = pg.PlotWidget()
+    obj.timelineWidget.setBackground('w')
+    obj.timelineWidget.setMaximumHeight(150)
+    obj.timeline_label = obj.timelineWidget.plotItem
+    obj.timeline_label.setLabels(left = '[ms]', bottom = 'Interval number')
+    # Windows are drawn at their middle interval, under the same part of the signal
+    obj.timeline_label.setXLink(obj.plot_label)
+    obj.timeline_legend = obj.timeline_label.addLegend(offset=(1, 1), labelTextSize='6pt')
+    obj.timeline_sdnn = obj.timeline_label.plot(pen='b', name='SDNN (5 min)')
+    obj.timeline_rmssd = obj.timeline_label.plot(pen='r', name='RMSSD (5 min)')
+
+# Colors of artifacts found with each method
+ARTIFACT_COLORS = {'Tarvainen': (255, 196, 61, 255),
+                   'Quotient': (6, 214, 160, 255),
+                   'Square': (248, 131, 121, 255),
+                   'T1': (192, 214, 223, 255),
+                   'T2': (192, 50, 33, 255),
+                   'T3': (157, 68, 181, 255),
+                   'Manual': (68, 43, 72, 255)}
+
+def create_plot_items(obj):
+    """
+    Create persistent items for RR signal and artifacts - later updates only change their data
+    """
+    obj.RRs = pg.PlotCurveItem(pen='b')
+    obj.plot_art.addItem(obj.RRs)
+    # Only visible part of the signal is drawn - redraw it when the view changes
+    obj.rr_pyramid = MinMaxPyramid([])
+    obj.plot_label.vb.sigXRangeChanged.connect(lambda *args: obj.update_visible_signal())
+    obj.plot_label.vb.sigResized.connect(lambda *args: obj.update_visible_signal())
+
+    obj.scatter_points = {}
+    obj.scatter_poincare = {}
+    for key, color in ARTIFACT_COLORS.items():
+        obj.scatter_points[key] = pg.ScatterPlotItem(brush=pg.mkBrush(*color), hoverable=True)
+        obj.p3.addItem(obj.scatter_points[key])
+        obj.scatter_poincare[key] = pg.ScatterPlotItem(brush=pg.mkBrush(*color), hoverable=True)
+        obj.plot_poincare.addItem(obj.scatter_poincare[key])
+        obj.legend.addItem(obj.scatter_points[key], key)
+
 def add_point_to_graph(obj):
     obj.plot_cursor.clear()
-    RR_values = np.array([interval.value for interval in obj.examination.RR_intervals])
-    obj.cursor_coords = pg.ScatterPlotItem([obj.coords_x], [RR_values[obj.coords_x]],
+    obj.cursor_coords = pg.ScatterPlotItem(obj.selected, obj.examination.RR[obj.selected],
                                        brush=pg.mkBrush(0, 255, 0, 120),
                                        size = 12,
                                        hoverable=True)
@@ -2,20 +2,35 @@
 Module responsible for signal analisys
 """
 
+import itertools
+
 import numpy as np
 #from hrvanalysis import get_time_domain_features, get_poincare_plot_features, get_frequency_domain_features, get_sampen
-from statsmodels.tsa.stattools import adfuller
-import pyqtgraph as pg
 import scipy
+from timing import stage, timed
 
+@timed()
 def count_hrv(obj):
     """
-    Function returning HRV params in time, freq, nonlinear domains
+    Function returning HRV params in time, freq, nonlinear domains (without
+    entropy measures, which are not shown in the window)
+    """
+    set_hrv_range(obj)
+    examination = obj.examination
+    # Stationarity test is counted once per signal version, shared with the background task
+    key = (examination.version, obj.stationarity_mode.currentData())
+    hrv_params = compute_hrv(examination.RR, stationarity_mode=key[1],
+                             stationarity=examination.stationarity.get(key), entropy=False)
+    examination.stationarity[key] = hrv_params["stationarity"]
+    return hrv_params
+
+def set_hrv_range(obj):
+    """
+    Function reading range of HRV analysis from the GUI and drawing its bounds
     """
-    
     if obj.h1.isChecked() == True:
         obj.exam_start=0
-        obj.exam_stop=len(obj.examination.RR_intervals)-1
+        obj.exam_stop=len(obj.examination.RR)-1
         obj.hrv_range.clear()
     else:
         try:
@@ -26,34 +41,109 @@ def count_hrv(obj):
         try:
             obj.exam_stop=int(obj.textbox_end.text())
             if obj.exam_stop <= obj.exam_start:
-                obj.exam_stop = str(len(obj.examination.RR_intervals)-1)
-                obj.textbox_end.setText(str(len(obj.examination.RR_intervals)-1))
+                obj.exam_stop = str(len(obj.examination.RR)-1)
+                obj.textbox_end.setText(str(len(obj.examination.RR)-1))
         except:
-            obj.exam_stop=len(obj.examination.RR_intervals)-1
-            obj.textbox_end.setText(str(len(obj.examination.RR_intervals)-1))
-        # narysowanie granic przedziału
+            obj.exam_stop=len(obj.examination.RR)-1
+            obj.textbox_end.setText(str(len(obj.examination.RR)-1))
+        # narysowanie granic przedziału (Qt is imported only by the GUI, not batch workers)
+        import pyqtgraph as pg
         obj.hrv_range.clear()
         obj.hrv_range.addItem(pg.InfiniteLine(obj.exam_start, pen='r'))
         obj.hrv_range.addItem(pg.InfiniteLine(obj.exam_stop, pen='r'))
-    subset_values = [interval.value for interval in obj.examination.RR_intervals]
-    stationarity_result = adfuller(subset_values)[1]
+
+# Stationarity tests: mode -> description shown in the GUI
+STATIONARITY_MODES = {"adf-fixed": "ADF, fixed lag",
+                      "adf-decimated": "ADF on decimated signal",
+                      "drift": "segment mean/variance drift",
+                      "adf": "ADF, lag chosen by AIC (slow)"}
+# Length of the signal the "adf-decimated" test is run on
+DECIMATED_LENGTH = 2000
+# Number of segments compared by the "drift" test
+DRIFT_SEGMENTS = 10
+
+def test_stationarity(RR, mode="adf-fixed"):
+    """
+    Function returning p-value of stationarity test chosen with mode (see STATIONARITY_MODES).
+    For ADF tests small p-value means stationary signal, for the drift test - non-stationary.
+    """
+    RR = np.asarray(RR, dtype=float)
+    if mode.startswith("adf"):
+        # statsmodels takes long to import, so it is loaded on first ADF test
+        from statsmodels.tsa.stattools import adfuller
+    if mode == "adf":
+        return adfuller(RR)[1]
+    elif mode == "adf-fixed":
+        # Schwert's rule for the lag, without searching for the best one
+        return adfuller(RR, maxlag=int(4 * (len(RR) / 100) ** 0.25), autolag=None)[1]
+    elif mode == "adf-decimated":
+        # Means of consecutive blocks, full ADF on the shorter signal
+        factor = max(len(RR) // DECIMATED_LENGTH, 1)
+        return adfuller(RR[:len(RR) // factor * factor].reshape(-1, factor).mean(axis=1))[1]
+    elif mode == "drift":
+        # Do means and variances of segments differ (Bonferroni-corrected)?
+        segments = np.array_split(RR, DRIFT_SEGMENTS)
+        p_mean = scipy.stats.f_oneway(*segments).pvalue
+        p_var = scipy.stats.levene(*segments, center='mean').pvalue
+        return min(2 * min(p_mean, p_var), 1.0)
+    raise ValueError(f"Unknown stationarity mode: {mode}")
+
+@timed()
+def compute_hrv(RR, progress=None, stationarity_mode="adf-fixed", stationarity=None, entropy=True,
+                entropy_templates=None):
+    """
+    Function returning HRV params in time, freq, nonlinear domains for RR series.
+    progress(percent) is called between the stages, if given. stationarity is
+    a p-value already counted for this series with stationarity_mode, if any.
+    Entropy measures (the slowest nonlinear params) are skipped if entropy is False
+    and estimated from entropy_templates templates if it is given.
+    """
+    progress = progress or (lambda percent: None)
+    progress(0)
+    if stationarity is None:
+        with stage(f"stationarity[{stationarity_mode}]", len(RR)):
+            stationarity = test_stationarity(RR, stationarity_mode)
+    progress(40)
+    with stage("time domain", len(RR)):
+        hrv_time = count_time_domain(RR)
+    progress(50)
+    with stage("nonlinear", len(RR)):
+        hrv_nonlinear = count_nonlinear(RR, entropy, entropy_templates)
+    progress(60)
+    with stage("freq domain", len(RR)):
+        hrv_freq = count_freq_domain(RR)
+    progress(100)
     
-    hrv_params = {"stationarity": stationarity_result,
-                  "hrv_time": count_time_domain(subset_values),
-                  "hrv_nonlinear": count_nonlinear(subset_values),
-                  "hrv_freq": count_freq_domain(subset_values)
+    hrv_params = {"stationarity": stationarity,
+                  "stationarity_mode": stationarity_mode,
+                  "hrv_time": hrv_time,
+                  "hrv_nonlinear": hrv_nonlinear,
+                  "hrv_freq": hrv_freq
                 }
     return hrv_params
 
 def create_hrv_summary(hrv_params, show_all = False):
-    if hrv_params["stationarity"] <= 0.05:
-        stationarity_text = f"signal is stational (p-value {round(hrv_params['stationarity'], 3)} for adfuller test)"
+    mode = hrv_params.get("stationarity_mode", "adf")
+    test_name = "drift test" if mode == "drift" else "adfuller test"
+    # Null hypothesis of the drift test is stationarity, of ADF - unit root
+    stationary = hrv_params["stationarity"] > 0.05 if mode == "drift" else hrv_params["stationarity"] <= 0.05
+    if stationary:
+        stationarity_text = f"signal is stational (p-value {round(hrv_params['stationarity'], 3)} for {test_name})"
     else:
-        stationarity_text = f"WARNING! Non-stationary signal (p-value for adfuller test: {round(hrv_params['stationarity'], 3)})\n"
+        stationarity_text = f"WARNING! Non-stationary signal (p-value for {test_name}: {round(hrv_params['stationarity'], 3)})\n"
     #stationarity_text = ""
     hrv_time = hrv_params["hrv_time"]
     hrv_freq = hrv_params["hrv_freq"]
     hrv_nonlinear = hrv_params["hrv_nonlinear"]
+    if "sampen" in hrv_nonlinear:
+        estimated = hrv_nonlinear.get("entropy_templates")
+        entropy_title = f"Entropy (estimated from {estimated} templates)" if estimated else "Entropy"
+        entropy_text = f"""
+{entropy_title}:
+SampEn: {np.round(hrv_nonlinear['sampen'], 3)}
+ApEn: {np.round(hrv_nonlinear['apen'], 3)}"""
+    else:
+        entropy_text = ""
     if show_all:
         text = f"""{stationarity_text}
 Time-domain HRV parameters:
@@ -61,6 +151,8 @@ Mean RRi [ms]: {np.round(hrv_time['mean'], 3)}
 SDNN [ms]: {np.round(hrv_time['sdnn'], 3)}
 RMSSD [ms]: {np.round(hrv_time['rmssd'], 3)}
 pNN50 [%] : {np.round(hrv_time['pnnx'], 3)}
+TINN [ms]: {np.round(hrv_time['tinn'], 3)}
+HRV triangular index: {np.round(hrv_time['triangular_index'], 3)}
 
 Frequency-domain HRV parameters:
 LF [ms2]: {np.round(hrv_freq['LFabs'],5)}
@@ -72,6 +164,11 @@ LF/HF: {np.round(hrv_freq['LFHF'],5)}
 HPoincare descriptors:
 SD1 [ms]: {np.round(hrv_nonlinear['sd1'], 3)}
 SD2 [ms]: {np.round(hrv_nonlinear['sd2'], 3)}
+
+Detrended fluctuation analysis:
+DFA alpha1: {np.round(hrv_nonlinear['dfa_a1'], 3)}
+DFA alpha2: {np.round(hrv_nonlinear['dfa_a2'], 3)}
+{entropy_text}
         """
     else:
         text = f"{stationarity_text}"
@@ -85,52 +182,109 @@ SD2 [ms]: {np.round(hrv_nonlinear['sd2'], 3)}
     results["LFHF"] = np.median(lfhf)
 
 
-def count_freq_domain(RR):
+# Frequency bands [Hz] of spectral HRV params
+VLF_BAND = [0.0033, 0.04]
+LF_BAND = [0.04, 0.15]
+HF_BAND = [0.15, 0.4]
+# Params counted by band_powers
+BAND_POWERS = ("VLFabs", "LFabs", "HFabs", "LFnu", "HFnu", "LFHF")
+
+def resample_rr(RR, interpRate=3):
     """
-    Counting HRV params in freq domain
+    Resampling RR series with cubic interpolation to interpRate Hz.
+    Returns time vector [s] and resampled series.
     """
-    vlfBand = [0.0033, 0.04]
-    lfBand = [0.04, 0.15]
-    hfBand = [0.15, 0.4]
-    interpRate = 3
     # Creating time vector by cummulating durations of intervals
-    timeSig_tmp = np.cumsum(RR).tolist()
-    seriesSig = RR
+    timeSig_tmp = np.cumsum(RR)
 
     # Changing values to miliseconds if given in seconds
-    medDiff = np.median([x - y for x, y in zip(timeSig_tmp[1:], timeSig_tmp[:-1])])
+    medDiff = np.median(np.diff(timeSig_tmp))
     if medDiff > 20:  
-        timeSig_tmp = [t/1000 for t in timeSig_tmp] 
+        timeSig_tmp = timeSig_tmp / 1000
 
     # Set time occurance of interval as middle value of its duration 
-    timeSig = [timeSig_tmp[i-1]+ timeSig_tmp[i]/2 for i in range(1, len(timeSig_tmp))]
-    timeSig.insert(0, timeSig[0]/2)
+    timeSig = timeSig_tmp[:-1] + timeSig_tmp[1:] / 2
+    timeSig = np.concatenate(([timeSig[0] / 2], timeSig))
 
     # iInterpolation
-    funcInterp = scipy.interpolate.interp1d(timeSig, seriesSig, 'cubic')
+    funcInterp = scipy.interpolate.interp1d(timeSig, RR, 'cubic')
     newTime = np.arange(timeSig[0], timeSig[-1], 1 / interpRate)
-    newSeries = funcInterp(newTime)
+    return newTime, funcInterp(newTime)
 
-    # Periodogram
-    f, psd = scipy.signal.periodogram(newSeries, interpRate, detrend='linear')
-    vlfRange = (vlfBand[0] <= f) * (f <= vlfBand[1])
-    lfRange = (lfBand[0] <= f) * (f <= lfBand[1])
-    hfRange = (hfBand[0] <= f) * (f <= hfBand[1])
+def band_powers(f, psd):
+    """
+    Counting power in VLF, LF and HF bands from PSD (spectra along the last axis)
+    """
+    vlfRange = (VLF_BAND[0] <= f) * (f <= VLF_BAND[1])
+    lfRange = (LF_BAND[0] <= f) * (f <= LF_BAND[1])
+    hfRange = (HF_BAND[0] <= f) * (f <= HF_BAND[1])
 
     freqResol = f[1]-f[0]
     results = dict()
-    results["VLFabs"] = np.sum(psd[vlfRange]) * freqResol
-    results["LFabs"] = np.sum(psd[lfRange]) * freqResol
-    results["HFabs"] = np.sum(psd[hfRange]) * freqResol
+    results["VLFabs"] = np.sum(psd[..., vlfRange], axis=-1) * freqResol
+    results["LFabs"] = np.sum(psd[..., lfRange], axis=-1) * freqResol
+    results["HFabs"] = np.sum(psd[..., hfRange], axis=-1) * freqResol
     results["LFnu"] = 100.0 * results["LFabs"] / (results["LFabs"] + results["HFabs"])
     results["HFnu"] = 100.0 * results["HFabs"] / (results["LFabs"] + results["HFabs"])
     results["LFHF"] = results["LFabs"] / results["HFabs"]
+    return results
+
+def count_freq_domain(RR):
+    """
+    Counting HRV params in freq domain
+    """
+    interpRate = 3
+    newTime, newSeries = resample_rr(RR, interpRate)
+
+    # Periodogram
+    f, psd = scipy.signal.periodogram(newSeries, interpRate, detrend='linear')
+    return band_powers(f, psd)
+
+# Number of windows whose spectra are counted as one batch of FFTs
+FREQ_WINDOW_CHUNK = 256
+
+def count_freq_domain_windows(RR, window=300, step=30, interpRate=3, method="periodogram"):
+    """
+    Counting HRV params in freq domain in sliding windows of window seconds moved by
+    step seconds. The series is resampled once and spectra of the windows are
+    counted in batches of FREQ_WINDOW_CHUNK FFTs. method is "periodogram" or
+    "welch" (Welch's method with 2 min segments). Returns dict of arrays with a
+    value per window and "time" - start of each window [s] since the first resampled point
+    (empty arrays if the series is too short for any window).
+    """
+    if method not in ("periodogram", "welch"):
+        raise ValueError(f"Unknown spectral method: {method}")
+    # Cubic interpolation needs at least 4 intervals
+    newSeries = resample_rr(RR, interpRate)[1] if len(RR) >= 4 else np.empty(0)
+    length = min(int(round(window * interpRate)), len(newSeries))
+    hop = max(int(round(step * interpRate)), 1)
+    if length >= 2:
+        segments = np.lib.stride_tricks.sliding_window_view(newSeries, length)[::hop]
+    else:
+        # No window with a spectrum
+        segments = np.empty((0, 0))
+
+    chunks = []
+    for start in range(0, len(segments), FREQ_WINDOW_CHUNK):
+        chunk = segments[start:start + FREQ_WINDOW_CHUNK]
+        if method == "periodogram":
+            f, psd = scipy.signal.periodogram(chunk, interpRate, detrend='linear', axis=-1)
+        else:
+            nperseg = min(120 * interpRate, length)
+            f, psd = scipy.signal.welch(chunk, interpRate, nperseg=nperseg, detrend='linear', axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            chunks.append(band_powers(f, psd))
 
+    results = {key: np.concatenate([chunk[key] for chunk in chunks]) if chunks else np.empty(0)
+               for key in BAND_POWERS}
+    results["time"] = np.arange(len(segments)) * hop / interpRate
     return results
 
-def count_nonlinear(RR):
+def count_nonlinear(RR, entropy=True, entropy_templates=None):
     """
-    Counting HRV params in nonlinear domain
+    Counting HRV params in nonlinear domain. Sample and approximate entropy
+    are skipped if entropy is False and estimated from at most entropy_templates
+    templates if it is given (see count_entropy).
     """
     diff_rr_intervals = np.diff(RR)
     results = dict()
@@ -138,8 +292,146 @@ def count_nonlinear(RR):
     results["sd1"] = np.sqrt(np.std(diff_rr_intervals, ddof=1) ** 2 * 0.5)
     # Poincare SD2
     results["sd2"] = np.sqrt(2 * np.std(RR, ddof=1) ** 2 - 0.5 * np.std(diff_rr_intervals, ddof=1) ** 2)
+    # Detrended fluctuation analysis
+    results["dfa_a1"] = count_dfa(RR, DFA_SHORT_SCALES)
+    results["dfa_a2"] = count_dfa(RR, DFA_LONG_SCALES)
+    if entropy:
+        results["sampen"], results["apen"] = count_entropy(RR, max_templates=entropy_templates)
+        if entropy_templates is not None and len(RR) - 2 > entropy_templates:
+            # Estimates, not counted for all templates
+            results["entropy_templates"] = entropy_templates
     return results
 
+# Window sizes [beats] of short-term (alpha1) and long-term (alpha2) DFA exponents
+DFA_SHORT_SCALES = np.arange(4, 17)
+DFA_LONG_SCALES = np.arange(16, 65)
+
+def dfa_fluctuations(RR, scales):
+    """
+    Counting DFA fluctuation F(n) for each window size n in scales. The integrated
+    profile is split into non-overlapping windows (a reshaped view) and linear
+    trends of all windows are removed with one batched least-squares fit.
+    """
+    RR = np.asarray(RR, dtype=float)
+    profile = np.cumsum(RR - np.mean(RR))
+    fluctuations = np.full(len(scales), np.nan)
+    for k, n in enumerate(scales):
+        count = len(profile) // n
+        if count == 0:
+            continue
+        windows = profile[:count * n].reshape(count, n)
+        x = np.arange(n) - (n - 1) / 2
+        centred = windows - windows.mean(axis=1, keepdims=True)
+        slopes = centred @ x / (x @ x)
+        residuals = centred - slopes[:, None] * x
+        fluctuations[k] = np.sqrt(np.mean(residuals * residuals))
+    return fluctuations
+
+def count_dfa(RR, scales):
+    """
+    Counting DFA scaling exponent - slope of log F(n) against log n over scales
+    """
+    fluctuations = dfa_fluctuations(RR, scales)
+    valid = np.isfinite(fluctuations) & (fluctuations > 0)
+    if np.count_nonzero(valid) < 2:
+        return np.nan
+    return np.polyfit(np.log(np.asarray(scales)[valid]), np.log(fluctuations[valid]), 1)[0]
+
+# Number of templates queried at once while counting neighbours
+ENTROPY_CHUNK = 20000
+
+def _count_similar_tree(templates, r, queries):
+    """
+    Number of templates (including itself) within Chebyshev distance r of each template
+    under indices queries. Counts are found with a KD-tree, once for each distinct
+    queried template, in chunks.
+    """
+    tree = scipy.spatial.cKDTree(templates, leafsize=64)
+    distinct, inverse = np.unique(templates[queries], axis=0, return_inverse=True)
+    counts = np.concatenate([tree.query_ball_point(distinct[i:i + ENTROPY_CHUNK], r, p=np.inf,
+                                                   return_length=True, workers=-1)
+                             for i in range(0, len(distinct), ENTROPY_CHUNK)])
+    return counts[inverse.ravel()]
+
+def _count_similar_sorted(templates, r, queries):
+    """
+    Same as _count_similar_tree for templates of whole numbers (RR in ms). Distinct
+    templates are sorted by their values packed into one integer key and weighted
+    by multiplicity. For each offset (within r) of all values but the last,
+    similar templates form one window of sorted keys, counted with two binary searches.
+    """
+    m = templates.shape[1]
+    radius = int(np.floor(r))
+    low = templates.min()
+    # Values shifted by radius, so that offset values are non-negative and below span
+    span = int(templates.max() - low) + 2 * radius + 1
+    weights = span ** np.arange(m - 1, -1, -1, dtype=np.int64)
+    distinct, multiplicity = np.unique((templates - low + radius).astype(np.int64), axis=0,
+                                       return_counts=True)
+    keys = distinct @ weights
+    cumulative = np.concatenate(([0], np.cumsum(multiplicity)))
+
+    queried, inverse = np.unique((templates[queries] - low + radius).astype(np.int64), axis=0,
+                                 return_inverse=True)
+    queried_keys = queried @ weights
+    counts = np.zeros(len(queried), dtype=np.int64)
+    for offset in itertools.product(range(-radius, radius + 1), repeat=m - 1):
+        base = queried_keys + int(np.dot(offset, weights[:-1]))
+        counts += (cumulative[np.searchsorted(keys, base + radius, side='right')]
+                   - cumulative[np.searchsorted(keys, base - radius, side='left')])
+    return counts[inverse.ravel()]
+
+def _count_similar(templates, r, queries):
+    """
+    Number of templates (including itself) within Chebyshev distance r of each template
+    under indices queries - counted over sorted windows for whole numbers, with a
+    KD-tree otherwise
+    """
+    span = templates.max() - templates.min() + 2 * r + 1
+    if np.all(templates == np.trunc(templates)) and span ** templates.shape[1] < 2 ** 62:
+        return _count_similar_sorted(templates, r, queries)
+    return _count_similar_tree(templates, r, queries)
+
+def count_entropy(RR, m=2, r=0.2, max_templates=None):
+    """
+    Counting sample entropy (Richman & Moorman) and approximate entropy (Pincus)
+    of RR with templates of length m and tolerance r * SD. Both are counted from
+    the same numbers of similar templates of length m and m + 1. If max_templates
+    is given and there are more templates, the numbers are counted (against all
+    templates) only for max_templates evenly spaced ones, which gives an estimate.
+    """
+    RR = np.asarray(RR, dtype=float)
+    N = len(RR)
+    if N <= m + 1:
+        return np.nan, np.nan
+    tolerance = r * np.std(RR)
+    templates_m = np.lib.stride_tricks.sliding_window_view(RR, m)
+    templates_m1 = np.lib.stride_tricks.sliding_window_view(RR, m + 1)
+    if max_templates is not None and N - m > max_templates:
+        # Templates of length m + 1 and the first N - m of length m
+        queries = np.unique(np.linspace(0, N - m - 1, max_templates).astype(int))
+        count_m = _count_similar(templates_m, tolerance, queries)
+        phi_m = np.mean(np.log(count_m / (N - m + 1)))
+    else:
+        queries = np.arange(N - m)
+        count_all = _count_similar(templates_m, tolerance, np.arange(N - m + 1))
+        # The last template of length m has no counterpart of length m + 1
+        count_m = count_all[:-1]
+        phi_m = np.mean(np.log(count_all / (N - m + 1)))
+    count_m1 = _count_similar(templates_m1, tolerance, queries)
+
+    # ApEn: self-matches included
+    phi_m1 = np.mean(np.log(count_m1 / (N - m)))
+    apen = phi_m - phi_m1
+
+    # SampEn: only the first N - m templates of length m, without self-matches
+    last_similar = np.max(np.abs(templates_m[queries] - templates_m[-1]), axis=1) <= tolerance
+    B = np.sum(count_m - 1 - last_similar)
+    A = np.sum(count_m1 - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sampen = -np.log(A / B)
+    return sampen, apen
+
 def count_time_domain(RR, x=50, binWidth=7.8125):
     """
     Counting HRV params in time domain
@@ -159,43 +451,91 @@ def count_time_domain(RR, x=50, binWidth=7.8125):
         binwidthAux = binWidth/1000
     else: 
         binwidthAux = binWidth
+    # Histogram of RR intervals for geometric params
+    edges = np.arange(np.min(RR), np.max(RR) + binwidthAux, binwidthAux)
+    if len(edges) < 2:
+        edges = np.array([np.min(RR), np.min(RR) + binwidthAux])
+    hist, edges = np.histogram(RR, edges)
+    result["tinn"] = calcTINN(hist, edges)
+    result["triangular_index"] = len(RR) / np.max(hist)
 
     return result
 
 
-def calcTINN(hist, edges):
+def count_time_domain_windows(RR, window=300, step=30, x=50):
+    """
+    Counting HRV params in time domain in sliding windows of window seconds moved
+    by step seconds. All windows are counted at once from cumulative sums of RR,
+    RR^2 and successive differences. Returns dict of arrays with a value per
+    window; "start" and "stop" are indices of the first and one past the last
+    interval of each window. Windows with less than two intervals give NaN.
+    """
+    RR = np.asarray(RR, dtype=float)
+    in_seconds = len(RR) > 0 and np.mean(RR) < 20
+    scale = 1 if in_seconds else 1000
+    xAux = x/1000 if in_seconds else x
+    # Time of the end of each interval since the start of the examination, in seconds
+    t = np.concatenate(([0], np.cumsum(RR) / scale))
+    starts = np.arange(0, max(t[-1] - window, 0) + step, step)
+    start = np.searchsorted(t, starts)
+    stop = np.searchsorted(t, starts + window, side='right') - 1
+    stop = np.maximum(np.minimum(stop, len(RR)), start)
+
+    # Values are centred before summing to keep variances accurate on long recordings
+    offset = np.mean(RR) if len(RR) > 0 else 0
+    centred = RR - offset
+    diffSeg = np.diff(RR)
+    cum_rr = np.concatenate(([0], np.cumsum(centred)))
+    cum_rr2 = np.concatenate(([0], np.cumsum(centred * centred)))
+    cum_diff2 = np.concatenate(([0], np.cumsum(diffSeg * diffSeg)))
+    cum_nnx = np.concatenate(([0], np.cumsum(np.abs(diffSeg) > xAux)))
+
+    count = (stop - start).astype(float)
+    diff_count = count - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        valid = count >= 2
+        mean = (cum_rr[stop] - cum_rr[start]) / count
+        var = (cum_rr2[stop] - cum_rr2[start]) / count - mean * mean
+        diff_stop = np.maximum(stop - 1, start)
+        result = {"start": start,
+                  "stop": stop,
+                  "time": starts,
+                  "mean": np.where(valid, mean + offset, np.nan),
+                  "sdnn": np.where(valid, np.sqrt(np.maximum(var, 0)), np.nan),
+                  "rmssd": np.where(valid, np.sqrt((cum_diff2[diff_stop] - cum_diff2[start]) / diff_count), np.nan),
+                  "pnnx": np.where(valid, 100 * (cum_nnx[diff_stop] - cum_nnx[start]) / diff_count, np.nan)}
+    return result
+
 
+def calcTINN(hist, edges):
+    """
+    Counting TINN - width of the base of a triangle fitted to the histogram of RR
+    intervals. Errors of all triangles are counted at once from prefix sums, as
+    the error of the left side depends only on N and of the right side only on M.
+    """
+    hist = np.asarray(hist, dtype=float)
     maxBin, maxHist = np.argmax(hist), np.max(hist)
+    i = np.arange(len(hist))
+    cum_h = np.concatenate(([0], np.cumsum(hist)))
+    cum_ih = np.concatenate(([0], np.cumsum(i * hist)))
+    cum_h2 = np.concatenate(([0], np.cumsum(hist * hist)))
+
+    # Left side: zero before N, line from 0 at N up to maxHist at maxBin
+    n = np.arange(0, maxBin + 1)
+    K = maxBin - n
+    Kdiv = np.maximum(K, 1)
+    line2 = maxHist ** 2 * (K + 1) * (2 * K + 1) / (6 * Kdiv)
+    cross = maxHist / Kdiv * ((cum_ih[maxBin + 1] - cum_ih[n]) - n * (cum_h[maxBin + 1] - cum_h[n]))
+    errorN = cum_h2[n] + line2 - 2 * cross + (cum_h2[maxBin + 1] - cum_h2[n])
 
-    Nrange = range(0, maxBin + 1, 1)
-    Mrange = range(maxBin, len(hist), 1)
-    bestError = np.Inf
-    bestN = 0
-    bestM = len(hist) - 1
-    for n in Nrange:
-        for m in Mrange:
-            error = 0
-
-            # The region where the triangular fit is zero
-            # From the beggining up to N (increasing)
-            for left in range(0, n, 1):
-                error += hist[left] ** 2
-            # From the end up to M (decreasing)
-            for right in range(m + 1, len(hist), 1):
-                error += hist[right] ** 2
-
-            # The region where the triangular fit is nonzero
-            # From N to max
-            upLine = np.linspace(0, maxHist, maxBin - n + 1)  # Range = [n,maxBin]
-            error += np.sum((upLine - hist[n:maxBin + 1]) ** 2)
-
-            # From max to M
-            downLine = np.linspace(maxHist, 0, m - maxBin + 1)  # Range = [maxBin,m]
-            error += np.sum((downLine[1:] - hist[maxBin + 1:m + 1]) ** 2)  # Discard the first point (max) already compared in upLine
-
-            if error < bestError:
-                bestError = error
-                bestN = n
-                bestM = m
+    # Right side: line from maxHist at maxBin down to 0 at M (maxBin itself counted above), zero after M
+    m = np.arange(maxBin, len(hist))
+    J = m - maxBin
+    Jdiv = np.maximum(J, 1)
+    line2 = maxHist ** 2 * (J - 1) * J * (2 * J - 1) / (6 * Jdiv ** 2)
+    cross = maxHist / Jdiv * (m * (cum_h[m + 1] - cum_h[maxBin + 1]) - (cum_ih[m + 1] - cum_ih[maxBin + 1]))
+    errorM = line2 - 2 * cross + (cum_h2[m + 1] - cum_h2[maxBin + 1]) + (cum_h2[-1] - cum_h2[m + 1])
 
+    bestN = n[np.argmin(errorN)]
+    bestM = m[np.argmin(errorM)]
     return (edges[bestM] - edges[bestN])
\ No newline at end of file
@@ -1,4 +1,5 @@
-from PyQt6.QtWidgets import QPushButton, QButtonGroup, QRadioButton, QLabel, QLineEdit
+from PyQt6.QtWidgets import QPushButton, QButtonGroup, QRadioButton, QLabel, QLineEdit, QComboBox
+from hrv import STATIONARITY_MODES
 
 def initialize_hrv_options(obj):
     obj.param_hrv_label = QLabel("Set active signal length:")
@@ -22,7 +23,13 @@ def initialize_hrv_options(obj):
     obj.textbox_end = QLineEdit(obj)
     obj.textbox_end.setText("0")
 
-    for h in [obj.param_hrv_label, obj.h1, obj.h2, obj.recount]:
+    obj.stationarity_label = QLabel("Stationarity test:")
+    obj.stationarity_mode = QComboBox(obj)
+    for mode, description in STATIONARITY_MODES.items():
+        obj.stationarity_mode.addItem(description, mode)
+    obj.stationarity_mode.currentIndexChanged.connect(lambda:obj.update_hrv_params())
+
+    for h in [obj.param_hrv_label, obj.h1, obj.h2, obj.recount, obj.stationarity_label, obj.stationarity_mode]:
         obj.hrv_options_layout_1.addWidget(h)
     
     for h in [obj.start_label, obj.textbox_start, obj.end_label, obj.textbox_end]:
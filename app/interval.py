@@ -1,11 +1,13 @@
+"""
+Codes of artifact types and correction methods in the per-interval arrays of Examination
+"""
+
+# Artifact types, in the order used for artifact-type codes
+ARTIFACT_TYPES = ("Tarvainen", "Quotient", "Square", "T1", "T2", "T3", "Manual")
+# Code stored for intervals that were never corrected as an artifact
+NO_ARTIFACT = -1
+# Bit of each artifact type in the per-interval artifact mask
+ARTIFACT_BITS = {atype: 1 << i for i, atype in enumerate(ARTIFACT_TYPES)}
+# Correction methods, in the order of columns of the correction counters
+CORRECTION_METHODS = ("linear interpolation", "cubic splain", "moving average", "pre mean")
 
-class Interval():
-    def __init__(self, value):
-        self.value = int(value)
-        self.artifact = None
-        self.correction_methods = {
-            "linear interpolation": 0,
-            "cubic splain": 0,
-            "moving average": 0,
-            "pre mean": 0
-        }
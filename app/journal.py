@@ -0,0 +1,187 @@
+"""
+Module responsible for undo and redo of changes of an examination.
+
+Changes are stored as deltas: intervals removed from the examination with
+their values, and old and new values of the intervals that were changed.
+Undoing or redoing a change touches only the intervals it changed (plus
+reinserting or removing intervals from the per-interval arrays).
+"""
+from contextlib import contextmanager
+
+import numpy as np
+
+# Per-interval arrays of Examination tracked by the journal
+ARRAYS = ("RR", "artifact_type", "corrections", "artifact_mask")
+# Number of changes that can be undone
+UNDO_LIMIT = 50
+
+
+def _changed(old, new):
+    """
+    Mask of entries (rows of 2D arrays) differing between old and new
+    """
+    different = old != new
+    if old.dtype.kind == "f":
+        different &= ~(np.isnan(old) & np.isnan(new))
+    if different.ndim > 1:
+        different = different.any(axis=tuple(range(1, different.ndim)))
+    return different
+
+
+def _same_classes(old, new):
+    """
+    True if both dicts of Tarvainen classes hold the same indices
+    """
+    return old.keys() == new.keys() and all(np.array_equal(old[key], new[key]) for key in old)
+
+
+class Delta():
+    """
+    Change of an examination: intervals removed (indices before the change)
+    with their values, then intervals changed (indices after the removal) with
+    their old and new values in each of ARRAYS, and old and new Tarvainen classes.
+    """
+    def __init__(self, removed, removed_values, changed, old, new, classes=(None, None)):
+        self.removed = removed
+        self.removed_values = removed_values
+        self.changed = changed
+        self.old = old
+        self.new = new
+        self.classes = classes
+
+    @property
+    def signal_changed(self):
+        """
+        True if the change affects RR values, not only artifact marks
+        """
+        return len(self.removed) > 0 or any(name in self.old for name in ("RR", "corrections"))
+
+    @property
+    def nbytes(self):
+        arrays = [self.removed, self.changed, *self.removed_values.values(),
+                  *self.old.values(), *self.new.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def undo(self, exam):
+        for name, values in self.old.items():
+            getattr(exam, name)[self.changed] = values
+        if len(self.removed) > 0:
+            # Position of each removed interval among the remaining ones
+            positions = self.removed - np.arange(len(self.removed))
+            for name in ARRAYS:
+                setattr(exam, name, np.insert(getattr(exam, name), positions,
+                                              self.removed_values[name], axis=0))
+        if self.classes[0] is not None:
+            exam.tarvainen_classes = self.classes[0]
+        if self.signal_changed:
+            exam.version += 1
+
+    def redo(self, exam):
+        if len(self.removed) > 0:
+            keep = np.ones(len(exam.RR), dtype=bool)
+            keep[self.removed] = False
+            exam.keep(keep)
+        elif self.signal_changed:
+            exam.version += 1
+        for name, values in self.new.items():
+            getattr(exam, name)[self.changed] = values
+        if self.classes[1] is not None:
+            exam.tarvainen_classes = self.classes[1]
+
+
+def diff(before, after, removed=()):
+    """
+    Delta turning examination before into after, from which intervals with
+    indices removed (as returned by correct_artifacts) were deleted.
+    None if nothing changed.
+    """
+    removed = np.asarray(removed, dtype=int)
+    keep = np.ones(len(before.RR), dtype=bool)
+    keep[removed] = False
+    removed_values = {name: getattr(before, name)[removed] for name in ARRAYS}
+
+    kept = {name: getattr(before, name)[keep] for name in ARRAYS}
+    changed = np.zeros(len(after.RR), dtype=bool)
+    for name in ARRAYS:
+        changed |= _changed(kept[name], getattr(after, name))
+    changed = np.flatnonzero(changed)
+    old, new = {}, {}
+    for name in ARRAYS:
+        differs = _changed(kept[name][changed], getattr(after, name)[changed])
+        if differs.any():
+            old[name] = kept[name][changed]
+            new[name] = getattr(after, name)[changed]
+
+    classes = (None, None)
+    if not _same_classes(before.tarvainen_classes, after.tarvainen_classes):
+        classes = (before.tarvainen_classes, after.tarvainen_classes)
+    if len(removed) == 0 and not old and classes == (None, None):
+        return None
+    return Delta(removed, removed_values, changed, old, new, classes)
+
+
+class Journal():
+    """
+    Undo and redo stacks of deltas of an examination
+    """
+    def __init__(self, limit=UNDO_LIMIT):
+        self.limit = limit
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def record(self, delta):
+        """
+        Add delta of a new change; changes undone before can no longer be redone
+        """
+        if delta is None:
+            return
+        self.undo_stack.append(delta)
+        del self.undo_stack[:-self.limit]
+        self.redo_stack.clear()
+
+    @contextmanager
+    def edit(self, exam):
+        """
+        Record changes of artifact marks (and Tarvainen classes) of exam made in the with block
+        """
+        mask = exam.artifact_mask.copy()
+        classes = exam.tarvainen_classes
+        yield
+        changed = np.flatnonzero(mask != exam.artifact_mask)
+        old, new = {}, {}
+        if len(changed) > 0:
+            old["artifact_mask"] = mask[changed]
+            new["artifact_mask"] = exam.artifact_mask[changed]
+        if classes is not exam.tarvainen_classes:
+            classes = (classes, exam.tarvainen_classes)
+        elif old:
+            classes = (None, None)
+        else:
+            return
+        self.record(Delta(np.empty(0, dtype=int), {}, changed, old, new, classes))
+
+    def undo(self, exam):
+        """
+        Undo the last change of exam. Returns its delta, None if there was nothing to undo.
+        """
+        if not self.undo_stack:
+            return None
+        delta = self.undo_stack.pop()
+        delta.undo(exam)
+        self.redo_stack.append(delta)
+        return delta
+
+    def redo(self, exam):
+        """
+        Redo the last undone change of exam. Returns its delta, None if there was nothing to redo.
+        """
+        if not self.redo_stack:
+            return None
+        delta = self.redo_stack.pop()
+        delta.redo(exam)
+        self.undo_stack.append(delta)
+        return delta
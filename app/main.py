@@ -1,3 +1,6 @@
+import startup
+startup.start()
+
 import sys
 
 from PyQt6.QtWidgets import QApplication
@@ -5,7 +8,8 @@ from PyQt6.QtWidgets import QApplication
 from window import Window
 import warnings
 warnings.filterwarnings("ignore")
-app = QApplication(sys.argv)
-window = Window() 
+app = QApplication([arg for arg in sys.argv if arg != "--startup-time"])
+window = Window()
 window.show()
+startup.report()
 sys.exit(app.exec())
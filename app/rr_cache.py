@@ -0,0 +1,92 @@
+"""
+Module responsible for binary sidecar cache of parsed recordings.
+
+Parsed RR series is saved next to the recording as <file>.rrcache.npy together
+with <file>.rrcache.json describing the source (size, modification time, hash)
+and is memory-mapped when the recording is opened again.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+CACHE_VERSION = 1
+
+
+def sidecar_paths(path):
+    """
+    Paths of data and metadata files of the cache for recording under path
+    """
+    return f"{path}.rrcache.npy", f"{path}.rrcache.json"
+
+
+def file_hash(path):
+    """
+    SHA-1 of file contents
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load(path, **params):
+    """
+    Return (RR series, metadata) from the cache of recording under path or None
+    if there is no valid cache. params (e.g. parsing options) must match the
+    ones the cache was stored with. The series is memory-mapped copy-on-write,
+    so it can be modified without touching the cache.
+    """
+    data_path, meta_path = sidecar_paths(path)
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        stat = os.stat(path)
+        if meta["version"] != CACHE_VERSION or meta["params"] != params or meta["size"] != stat.st_size:
+            return None
+        if meta["mtime_ns"] != stat.st_mtime_ns:
+            # File was touched or copied - trust the cache only if contents are the same
+            if meta["sha1"] != file_hash(path):
+                return None
+            meta["mtime_ns"] = stat.st_mtime_ns
+            try:
+                _write_atomic(meta_path, lambda f: f.write(json.dumps(meta).encode()))
+            except OSError:
+                pass
+        RR = np.load(data_path, mmap_mode='c')
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return np.asarray(RR), meta
+
+
+def store(path, RR, rejected_lines=0, **params):
+    """
+    Save parsed RR series of recording under path. Failures (e.g. read-only
+    directory) are ignored - the recording will be parsed again next time.
+    """
+    data_path, meta_path = sidecar_paths(path)
+    try:
+        stat = os.stat(path)
+        meta = {"version": CACHE_VERSION,
+                "params": params,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha1": file_hash(path),
+                "rejected_lines": rejected_lines}
+        _write_atomic(data_path, lambda f: np.save(f, np.asarray(RR, dtype=float)))
+        _write_atomic(meta_path, lambda f: f.write(json.dumps(meta).encode()))
+    except OSError:
+        pass
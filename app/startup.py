@@ -0,0 +1,91 @@
+"""
+Module responsible for measuring the cold start of the application.
+
+If the CORRECTION_STARTUP_TIMING environment variable is set to a non-empty
+value other than "0" (or main.py is run with --startup-time), import time of
+every module and the time until the window is shown are printed to stderr.
+Only the standard library is imported here, so that the cost of numpy, Qt
+and the rest is measured as well.
+"""
+import importlib.abc
+import os
+import sys
+import time
+
+ENABLED = (os.environ.get("CORRECTION_STARTUP_TIMING", "") not in ("", "0")
+           or "--startup-time" in sys.argv)
+
+# Number of modules listed in the report
+TOP = 25
+
+_begin = time.perf_counter()
+# module name -> [cumulative time, own time (without nested imports)] [s]
+_imports = {}
+_stack = []
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """
+    Loader wrapper measuring execution of the module
+    """
+    def __init__(self, loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        _stack.append(0.0)
+        begin = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - begin
+            nested = _stack.pop()
+            if _stack:
+                _stack[-1] += elapsed
+            _imports[module.__name__] = [elapsed, elapsed - nested]
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class _TimedFinder(importlib.abc.MetaPathFinder):
+    """
+    Finder wrapping loaders of all other finders with _TimedLoader
+    """
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+def start():
+    """
+    Start measuring imports, if enabled
+    """
+    if ENABLED:
+        sys.meta_path.insert(0, _TimedFinder())
+
+
+def report(stream=None):
+    """
+    Print time since start and the most expensive imports, if enabled
+    """
+    if not ENABLED:
+        return
+    stream = stream or sys.stderr
+    sys.meta_path[:] = [finder for finder in sys.meta_path if not isinstance(finder, _TimedFinder)]
+    total = sum(own for _, own in _imports.values())
+    print(f"startup: {(time.perf_counter() - _begin) * 1000:.0f} ms, "
+          f"imports: {total * 1000:.0f} ms in {len(_imports)} modules", file=stream)
+    print(f"{'module':40} {'cumulative':>12} {'self':>10}", file=stream)
+    ranked = sorted(_imports.items(), key=lambda item: item[1][0], reverse=True)
+    for name, (cumulative, own) in ranked[:TOP]:
+        print(f"{name:40} {cumulative * 1000:>9.1f} ms {own * 1000:>7.1f} ms", file=stream)
@@ -0,0 +1,155 @@
+"""
+Module responsible for timing instrumentation of the main processing stages.
+
+Timing is off unless the CORRECTION_TIMING environment variable is set to a
+non-empty value other than "0". Then durations and array sizes of the
+instrumented stages are recorded and can be exported with export(). If
+CORRECTION_TIMING_TRACE is set to a .json or .csv path, the trace is also
+written there when the application exits. Only the last MAX_RECORDS stages
+are kept.
+"""
+import atexit
+import csv
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+ENABLED = os.environ.get("CORRECTION_TIMING", "") not in ("", "0")
+
+# Number of finished stages kept in records
+MAX_RECORDS = 100000
+
+# Finished stages, in order of finishing
+records = deque(maxlen=MAX_RECORDS)
+# Last finished top-level stage together with the stages nested in it
+last_operation = None
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _size_of(args):
+    """
+    Number of intervals processed - length of the first array-like argument
+    """
+    for arg in args:
+        if isinstance(arg, np.ndarray):
+            return len(arg)
+        for owner in (arg, getattr(arg, "examination", None)):
+            if hasattr(owner, "RR"):
+                return len(owner.RR)
+    return None
+
+
+@contextmanager
+def stage(name, size=None):
+    """
+    Record duration of the code in the with block as stage name processing size
+    intervals. Yields the record of the stage (None if timing is off).
+    """
+    if not ENABLED:
+        yield None
+        return
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    record = {"name": name, "size": size, "thread": threading.current_thread().name,
+              "depth": len(stack), "start": time.time(), "children": []}
+    stack.append(record)
+    begin = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration_ms"] = (time.perf_counter() - begin) * 1000
+        stack.pop()
+        children = record.pop("children")
+        global last_operation
+        with _lock:
+            records.append(record)
+            if stack:
+                stack[-1]["children"].append(record)
+                stack[-1]["children"].extend(children)
+            else:
+                last_operation = (record, children)
+
+
+def timed(name=None):
+    """
+    Decorator recording each call of a function as a stage
+    """
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            with stage(stage_name, _size_of(args)) as record:
+                result = function(*args, **kwargs)
+                if record["size"] is None and isinstance(result, np.ndarray):
+                    record["size"] = len(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def breakdown(operation=None):
+    """
+    Text describing the last top-level operation (or given one) and its stages
+    """
+    operation = operation or last_operation
+    if operation is None:
+        return ""
+    record, children = operation
+    size = f", {record['size']} intervals" if record["size"] is not None else ""
+    lines = [f"{record['name']}: {record['duration_ms']:.1f} ms{size}"]
+    for child in children:
+        lines.append(f"{'  ' * child['depth']}{child['name']}: {child['duration_ms']:.1f} ms")
+    return "\n".join(lines)
+
+
+def take():
+    """
+    Remove and return recorded stages, e.g. to send them from a worker process
+    """
+    with _lock:
+        taken = list(records)
+        records.clear()
+    return taken
+
+
+def merge(taken, thread=None):
+    """
+    Add stages recorded elsewhere (returned by take()), optionally under another thread name
+    """
+    with _lock:
+        for record in taken:
+            if thread is not None:
+                record["thread"] = thread
+            records.append(record)
+
+
+def export(path):
+    """
+    Write recorded stages to path - CSV if it ends with .csv, JSON otherwise
+    """
+    with _lock:
+        rows = [dict(record) for record in records]
+    fields = ["name", "size", "duration_ms", "start", "depth", "thread"]
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, "w") as f:
+            json.dump([{field: row[field] for field in fields} for row in rows], f, indent=1)
+
+
+if ENABLED and os.environ.get("CORRECTION_TIMING_TRACE"):
+    atexit.register(export, os.environ["CORRECTION_TIMING_TRACE"])
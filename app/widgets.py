@@ -5,12 +5,13 @@ Module responsible for widgets creation
 from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import (QCheckBox, QHBoxLayout, QLabel, QLineEdit,
                              QPushButton, QRadioButton, QButtonGroup,
-                             QComboBox)
+                             QComboBox, QProgressBar)
 
 from buttons_layout import create_buttons_layout
 from RR_layout import create_RR_layout
 from hrv_options import initialize_hrv_options
 from communiques import create_communiques
+import timing
 
 
 def create_widgets(obj) -> None:
@@ -26,6 +27,46 @@ def create_widgets(obj) -> None:
     obj.first_row.addWidget(obj.file_btn)
     obj.file_btn.clicked.connect(obj.open_dialog)
 
+    # Sheet and column (name or index) to read from csv and Excel files
+    obj.sheet_textbox = QLineEdit(obj)
+    obj.sheet_textbox.setPlaceholderText("Sheet: first")
+    obj.sheet_textbox.setMaximumWidth(100)
+    obj.first_row.addWidget(obj.sheet_textbox)
+    obj.column_textbox = QLineEdit(obj)
+    obj.column_textbox.setPlaceholderText("Column: default")
+    obj.column_textbox.setMaximumWidth(100)
+    obj.first_row.addWidget(obj.column_textbox)
+
+    # Recordings open in the workspace
+    obj.recordings_combo = QComboBox(obj)
+    obj.recordings_combo.setMinimumWidth(150)
+    obj.first_row.addWidget(obj.recordings_combo)
+    obj.recordings_combo.activated.connect(obj.switch_recording)
+    obj.close_btn = QPushButton(obj)
+    obj.close_btn.setText("Close")
+    obj.first_row.addWidget(obj.close_btn)
+    obj.close_btn.clicked.connect(obj.close_recording)
+
+    # Summary of loaded file
+    obj.file_info_label = QLabel("")
+    obj.first_row.addWidget(obj.file_info_label)
+
+    # Progress of computations running in the background
+    obj.progress_bar = QProgressBar(obj)
+    obj.progress_bar.setRange(0, 100)
+    obj.progress_bar.hide()
+    obj.first_row.addWidget(obj.progress_bar)
+    obj.cancel_btn = QPushButton(obj)
+    obj.cancel_btn.setText("Cancel")
+    obj.cancel_btn.hide()
+    obj.first_row.addWidget(obj.cancel_btn)
+    obj.cancel_btn.clicked.connect(obj.cancel_tasks)
+
+    # Durations of stages of the last operation (CORRECTION_TIMING=1)
+    obj.timing_label = QLabel("")
+    obj.timing_label.setVisible(timing.ENABLED)
+    obj.first_row.addWidget(obj.timing_label)
+
     # Layout: identify artifact
     obj.identification_layout = QHBoxLayout()
     obj.identification_label = QLabel("Options for artifacts identification:")
@@ -90,7 +131,7 @@ def create_widgets(obj) -> None:
     
     obj.del_btn = QPushButton(obj)
     obj.del_btn.setText("Delete single selection")
-    obj.del_btn.clicked.connect(lambda:obj.del_artifact([obj.coords_x]))
+    obj.del_btn.clicked.connect(lambda:obj.del_artifact(obj.selected))
     obj.a_buttons_layout.addWidget(obj.del_btn)    
 
     # Button that allows for clearing detections
@@ -2,18 +2,27 @@
 module containing Window definition
 """
 
+import os
+
 import numpy as np
 import pyqtgraph as pg
 from PyQt6.QtGui import QIcon
 from PyQt6.QtWidgets import QFileDialog, QHBoxLayout, QVBoxLayout, QWidget
 from PyQt6 import QtCore
 
-from artifacts import find_art_tarvainen, find_art_quotient, find_art_square, find_art1, find_art2, find_art3, remove_artifacts, find_art_quotient
-from examination import Examination
-from hrv import count_hrv, create_hrv_summary
+from artifacts import find_artifacts, detector_params, correct_artifacts, correction_params
+from detectors import run_detectors
+from examination import Examination, selector
+from export import export, export_format
+from hrv import compute_hrv, count_hrv, count_time_domain_windows, create_hrv_summary, set_hrv_range
 from widgets import create_widgets
-from graph import add_point_to_graph
+from graph import add_point_to_graph, create_plot_items
 from view_manager import initialize_views
+from decimation import MinMaxPyramid
+from journal import Journal, diff
+from workspace import Workspace
+from workers import Worker
+import timing
 
 class Window(QWidget):
     """
@@ -38,9 +47,29 @@ class Window(QWidget):
         # Mouse coordinations
         self.coords_x = None
         self.coords_y = None
+        # Indices of beats selected by click or Shift + drag
+        self.selected = np.array([], dtype=int)
         
+        # Computations running in the background, by task name
+        self.thread_pool = QtCore.QThreadPool()
+        self.tasks = {}
+
         # Create layout
         create_widgets(self)
+        # Artifact indices currently drawn, per artifact type
+        self.plotted_artifacts = {}
+        create_plot_items(self)
+        # Timing breakdown of the last operation, if timing is on
+        if timing.ENABLED:
+            self.timing_timer = QtCore.QTimer(self)
+            self.timing_timer.timeout.connect(lambda: self.timing_label.setText(timing.breakdown()))
+            self.timing_timer.start(500)
+        # Examination and its version HRV was last counted for
+        self.hrv_state = None
+        # Undo and redo of detections and corrections of the current recording
+        self.journal = Journal()
+        # Recordings open at the same time
+        self.workspace = Workspace()
        
 
     def open_dialog(self):
@@ -53,13 +82,75 @@ class Window(QWidget):
             "Open File",
         )
         if self.fname:
-            self.examination = Examination(self.fname)
-            self.h1.setChecked(True)
-            self.coords_x = None
-            self.update_plot()
-            # wpisanie numerów pierwszego i ostatniego interwału do textboxów 
-            self.textbox_start.setText("0")
-            self.textbox_end.setText(f"{str(len(self.examination.RR_intervals)-1)}")
+            sheet = selector(self.sheet_textbox.text())
+            column = selector(self.column_textbox.text())
+            key = (os.path.abspath(self.fname), sheet, column)
+            # Recording already open is switched to with the work done on it
+            if key not in self.workspace:
+                try:
+                    examination = Examination(self.fname, sheet=sheet, column=column)
+                except ValueError as e:
+                    self.file_info_label.setText(f"Could not read {self.fname}: {e}")
+                    return
+                name = os.path.basename(self.fname)
+                if sheet is not None or column is not None:
+                    name += f" [{'' if sheet is None else sheet}:{'' if column is None else column}]"
+                self.workspace.add(key, name, examination)
+            self.show_recording(self.workspace.select(key))
+
+    def show_recording(self, recording):
+        """
+        Make recording of the workspace current (an empty examination if None)
+        """
+        # Results computed for the previous recording are no longer needed
+        self.cancel_tasks()
+        if recording is None:
+            self.examination, self.journal = Examination(), Journal()
+            self.file_info_label.setText("")
+        else:
+            self.examination, self.journal = recording.examination, recording.journal
+            self.fname = self.examination.path
+            self.file_info_label.setText(f"{len(self.examination.RR)} intervals loaded, {self.examination.rejected_lines} lines skipped")
+        self.hrv_state = None
+        self.h1.setChecked(True)
+        self.coords_x = None
+        self.selected = np.array([], dtype=int)
+        self.update_recordings()
+        self.update_plot()
+        # wpisanie numerów pierwszego i ostatniego interwału do textboxów 
+        self.textbox_start.setText("0")
+        self.textbox_end.setText(f"{str(len(self.examination.RR)-1)}")
+
+    def update_recordings(self):
+        """
+        List recordings of the workspace, the current one selected
+        """
+        self.recordings_combo.blockSignals(True)
+        self.recordings_combo.clear()
+        for key, recording in self.workspace.recordings.items():
+            self.recordings_combo.addItem(recording.name, key)
+            self.recordings_combo.setItemData(self.recordings_combo.count() - 1, key[0], QtCore.Qt.ItemDataRole.ToolTipRole)
+            if key == self.workspace.active:
+                self.recordings_combo.setCurrentIndex(self.recordings_combo.count() - 1)
+        self.recordings_combo.blockSignals(False)
+
+    def switch_recording(self, index):
+        """
+        Switch to recording chosen in the list
+        """
+        key = self.recordings_combo.itemData(index)
+        if key is not None and key != self.workspace.active:
+            self.show_recording(self.workspace.select(key))
+
+    def close_recording(self):
+        """
+        Close the current recording and switch to the most recently used one
+        """
+        if self.workspace.active is None:
+            return
+        self.workspace.remove(self.workspace.active)
+        keys = list(self.workspace.recordings)
+        self.show_recording(self.workspace.select(keys[-1]) if keys else None)
 
     def mouse_moved(self, evt):
         """
@@ -78,36 +169,118 @@ class Window(QWidget):
         scene_coords = evt.scenePos()
         if self.graphWidget.sceneBoundingRect().contains(scene_coords):
             mouse_point = vb.mapSceneToView(scene_coords)
-            diff_y = np.abs(np.array([interval.value for interval in self.examination.RR_intervals]) - mouse_point.y())
-            diff_x = np.abs(np.array(range(len(self.examination.RR_intervals))) - mouse_point.x())
-            idx = (np.abs(diff_x + diff_y)).argmin()
+            # Distances are compared on screen, in pixels
+            unit_x, unit_y = vb.viewPixelSize()
+            idx = self.rr_pyramid.nearest(mouse_point.x(), mouse_point.y(), 1 / unit_x, 1 / unit_y)
+            if idx is None:
+                return
             self.coords_x = idx
+            self.selected = np.array([idx])
             add_point_to_graph(self)
 
+    def select_in_rect(self, rect):
+        """
+        Selecting all beats inside rectangle dragged with Shift pressed
+        """
+        self.selected = self.rr_pyramid.select(rect.left(), rect.right(), rect.top(), rect.bottom())
+        self.coords_x = self.selected[0] if len(self.selected) > 0 else None
+        add_point_to_graph(self)
+
+    def start_task(self, name, on_done, function, *args, **kwargs):
+        """
+        Running function(*args, **kwargs, progress=...) in the background. on_done(result)
+        is called in the GUI thread unless the signal was changed in the meantime
+        or a newer task with the same name was started.
+        """
+        if name in self.tasks:
+            self.tasks[name].cancel()
+        worker = Worker(function, *args, **kwargs)
+        worker.state = (id(self.examination), self.examination.version)
+        self.tasks[name] = worker
+
+        def finished(result):
+            if self.tasks.get(name) is not worker:
+                return
+            del self.tasks[name]
+            self.update_progress()
+            # Drop results counted for a signal which was edited meanwhile
+            if worker.state == (id(self.examination), self.examination.version):
+                on_done(result)
+
+        def failed(message):
+            if self.tasks.get(name) is worker:
+                del self.tasks[name]
+                self.update_progress()
+                self.file_info_label.setText(f"{name} failed: {message}")
+
+        # Signals are deleted by the event loop once the task ended, never
+        # by the garbage collector while they are being delivered
+        worker.signals.setParent(self)
+        worker.signals.ended.connect(worker.signals.deleteLater)
+        worker.signals.finished.connect(finished)
+        worker.signals.failed.connect(failed)
+        worker.signals.progress.connect(self.progress_bar.setValue)
+        self.update_progress()
+        self.thread_pool.start(worker)
+
+    def cancel_tasks(self):
+        """
+        Cancelling all computations running in the background
+        """
+        for worker in self.tasks.values():
+            worker.cancel()
+        self.tasks = {}
+        self.update_progress()
+
+    def update_progress(self):
+        """
+        Showing progress bar while any computation runs in the background
+        """
+        self.progress_bar.setVisible(len(self.tasks) > 0)
+        self.cancel_btn.setVisible(len(self.tasks) > 0)
+        if len(self.tasks) > 0:
+            self.progress_bar.setFormat(f"{', '.join(self.tasks)}: %p%")
+        else:
+            self.progress_bar.setValue(0)
+
     def update_hrv_params(self):
         """
-        Counting HRV
+        Counting HRV in the background
         """
-        new_params = create_hrv_summary(count_hrv(self))
-        self.hrv_label.setText(new_params)
+        if len(self.examination.RR) == 0:
+            return
+        set_hrv_range(self)
+        state = (id(self.examination), self.examination.version)
+        # Stationarity test is the slowest part - it is counted once per signal version
+        key = (self.examination.version, self.stationarity_mode.currentData())
+        examination = self.examination
+
+        def done(hrv_params):
+            examination.stationarity[key] = hrv_params["stationarity"]
+            self.hrv_label.setText(create_hrv_summary(hrv_params))
+            self.hrv_state = state
+
+        self.start_task("HRV", done, compute_hrv, self.examination.RR.copy(),
+                        stationarity_mode=key[1], stationarity=self.examination.stationarity.get(key),
+                        # Only the stationarity is shown in the window
+                        entropy=False)
    
     def choose_artifact(self):
         """
         Manual selection of RR interval 
         """
-        if self.coords_x:
-            self.examination.artifacts["Manual"].append(self.coords_x)
+        if len(self.selected) > 0:
+            with self.journal.edit(self.examination):
+                self.examination.add_artifacts("Manual", self.selected)
             self.plot_artifacts()
 
     def del_artifact(self, points_to_del):
         """ 
         Manual removal of artifact
         """
-        for key in self.examination.artifacts.keys():
-            if len(points_to_del) > 0:
-                for point in points_to_del:
-                    if point in self.examination.artifacts[key]:
-                        self.examination.artifacts[key].remove(point)
+        points_to_del = [point for point in points_to_del if point is not None]
+        with self.journal.edit(self.examination):
+            self.examination.clear_artifacts(points_to_del)
         
         self.plot_artifacts()
 
@@ -117,77 +290,88 @@ class Window(QWidget):
         """
         dialog = QFileDialog()
         file_name = f"{self.examination.path[:-4]}_clean" if self.h1.isChecked() == True else f"{self.examination.path[:-4]}_short_clean"
-        fname, _ = dialog.getSaveFileName(
+        filters = {"txt": "Text (*.txt)", "csv": "CSV with per-beat flags (*.csv)",
+                   "npz": "NumPy archive with per-beat flags (*.npz)",
+                   "parquet": "Parquet with per-beat flags (*.parquet)"}
+        fname, chosen_filter = dialog.getSaveFileName(
             self,
             "Open File",
             f"{file_name}",
+            ";;".join(filters.values()),
         )
         if len(fname)> 0:
-            if ".txt" in fname:
-                fname = fname[:-4]
-            if self.h1.isChecked() == True:
-                self.examination.save_to_txt(f"{fname}.txt")
-            else:
-                self.examination.save_to_txt(f"{fname}.txt", range=[self.exam_start, self.exam_stop])
-            with open(f'{fname}_stats.txt', 'w') as f:
-                f.write(f"number of removed artifacts: {self.examination.original_len - len(self.examination.RR_intervals)}\n")
-                f.write(f"number of corrected artifacts: {sum(1 for interval in self.examination.RR_intervals if (interval.artifact is not None))}\n")
-                
-                for key in self.examination.RR_intervals[0].correction_methods.keys():
-                    sum_pre_mean_artifact_true = sum(interval.correction_methods[key] for interval in self.examination.RR_intervals if interval.artifact)
-                    f.write("Count for %s: %s\n" % (key, sum_pre_mean_artifact_true))
-
-                unique_artifacts = {interval.artifact for interval in self.examination.RR_intervals if interval.artifact}
-
-                sums_by_artifact = {value: sum(1 for interval in self.examination.RR_intervals if interval.artifact == value) for value in unique_artifacts}
-                for artifact, total_sum in sums_by_artifact.items():
-                    f.write(f"Count for {artifact}: {total_sum}\n")
-    
-                
-                f.write("\nHRV parameters:\n")
-                f.write(self.hrv_label.text())
+            # Saved stats must describe the current signal
+            if self.hrv_state != (id(self.examination), self.examination.version):
+                if "HRV" in self.tasks:
+                    self.tasks.pop("HRV").cancel()
+                    self.update_progress()
+                self.hrv_label.setText(create_hrv_summary(count_hrv(self)))
+                self.hrv_state = (id(self.examination), self.examination.version)
+            fmt = export_format(fname, default=next((fmt for fmt, name in filters.items() if name == chosen_filter), "txt"))
+            if fname.lower().endswith(f".{fmt}"):
+                fname = fname[:-len(fmt) - 1]
+            start, stop = (None, None) if self.h1.isChecked() == True else (self.exam_start, self.exam_stop)
+            try:
+                export(self.examination, f"{fname}.{fmt}", fmt, start, stop)
+            except ImportError as e:
+                self.file_info_label.setText(f"Could not save {fmt}: {e}")
+                return
+            self.examination.save_stats(f'{fname}_stats.txt', self.hrv_label.text())
 
     def auto_detect(self):
         """
         Automatic detection for T1-T3
         """
-        if len(self.examination.RR_intervals) > 0:
-            self.examination.artifacts["T1"] = find_art1(self)
-            self.examination.artifacts["T2"] = find_art2(self)
-            self.examination.artifacts["T3"] = find_art3(self)
+        if len(self.examination.RR) > 0:
+            found = find_artifacts(self, ["T1", "T2", "T3"])
+            with self.journal.edit(self.examination):
+                for atype, artifacts in found.items():
+                    self.examination.set_artifacts(atype, artifacts)
             self.plot_artifacts()
 
     def auto_tarvainen(self):
         """
         Automatic detection for Tarvainen
         """
-        if len(self.examination.RR_intervals) > 0:
-            self.examination.artifacts["Tarvainen"] = find_art_tarvainen(self)
-            self.plot_artifacts()
+        if len(self.examination.RR) > 0:
+            def done(result):
+                found, details = result
+                with self.journal.edit(self.examination):
+                    self.examination.tarvainen_classes = details["Tarvainen"]
+                    self.examination.set_artifacts("Tarvainen", found["Tarvainen"])
+                self.plot_artifacts()
+
+            # Cancelling takes effect between the stages of the detection
+            self.start_task("Tarvainen", done, run_detectors, self.examination.RR.copy(),
+                            detector_params(self, ["Tarvainen"]))
 
     def auto_poincare(self):
         """
         Automatic detection for Quotient
         """
-        if len(self.examination.RR_intervals) > 0:
-            self.examination.artifacts["Quotient"] = find_art_quotient(self)
+        if len(self.examination.RR) > 0:
+            found = find_artifacts(self, ["Quotient"])
+            with self.journal.edit(self.examination):
+                self.examination.set_artifacts("Quotient", found["Quotient"])
             self.plot_artifacts()
 
     def auto_square(self):
         """
         Automatic detection for Square
         """
-        if len(self.examination.RR_intervals) > 0:
-            self.examination.artifacts["Square"] = find_art_square(self)
+        if len(self.examination.RR) > 0:
+            found = find_artifacts(self, ["Square"])
+            with self.journal.edit(self.examination):
+                self.examination.set_artifacts("Square", found["Square"])
             self.plot_artifacts()
     
     def clear_artifacts(self):
         """
         Clear all detections
         """
-        if len(self.examination.RR_intervals) > 0:
-            for key in (self.examination.artifacts.keys()):
-                self.examination.artifacts[key] = []
+        if len(self.examination.RR) > 0:
+            with self.journal.edit(self.examination):
+                self.examination.clear_artifacts()
             self.plot_artifacts()
 
             
@@ -197,10 +381,55 @@ class Window(QWidget):
         """
         self.chosen_artifacts = [chbx.text() for chbx in self.checkbox_list if chbx.isChecked()]
         if len(self.chosen_artifacts) > 0:
-            to_del = remove_artifacts(self)
+            # Correction runs on a copy which replaces the examination when done
+            before = self.examination
+            examination = before.copy()
+            marked = before.artifact_mask.copy()
+            version = before.version
+            params = correction_params(self)
+
+            def correct(progress):
+                removed = correct_artifacts(examination, progress=progress, **params)
+                return examination, diff(before, examination, removed)
+
+            def done(result):
+                corrected, delta = result
+                # Artifacts marked or unmarked (or changes undone) meanwhile would be lost
+                if (self.examination is before and self.examination.version == version
+                        and np.array_equal(self.examination.artifact_mask, marked)):
+                    self.examination = corrected
+                    self.workspace.replace(corrected)
+                    self.journal.record(delta)
+                    self.update_plot()
+
+            self.start_task("Correction", done, correct)
+
+    def undo(self):
+        """
+        Undo the last detection, manual change or correction
+        """
+        self.apply_journal(self.journal.undo(self.examination))
+
+    def redo(self):
+        """
+        Redo the last undone change
+        """
+        self.apply_journal(self.journal.redo(self.examination))
+
+    def apply_journal(self, delta):
+        """
+        Redraw after a change was undone or redone
+        """
+        if delta is None:
+            return
+        # Running corrections started from the state before
+        if "Correction" in self.tasks:
+            self.tasks.pop("Correction").cancel()
+            self.update_progress()
+        if delta.signal_changed:
             self.update_plot()
-            self.del_artifact(to_del)
-            self.update_hrv_params()
+        else:
+            self.plot_artifacts()
 
     def create_poincare(self):
         self.poincareWidget = pg.PlotWidget()
@@ -242,86 +471,85 @@ class Window(QWidget):
         
     
 
+    @timing.timed()
     def update_plot(self):
         """
-        Updating plot after correction
+        Updating plot after the signal changed (new file or correction)
         """
-        for p in [self.plot_art, self.p3, self.plot_cursor, self.legend, self.plot_poincare]:
-            p.clear()
+        self.plot_cursor.clear()
+        self.coords_x = None
+        self.selected = np.array([], dtype=int)
         
-        self.plot_label.setXRange(-100, len(self.examination.RR_intervals)+150, padding=0)
-        self.plot_label.setYRange(-100, max(self.examination.RR_intervals, key=lambda interval: interval.value).value+150, padding=0)
-        self.RRs = pg.PlotCurveItem([interval.value for interval in self.examination.RR_intervals], pen='b')
-        self.plot_art.addItem(self.RRs)
-        self.update_hrv_params() 
+        RR = self.examination.RR
+        self.rr_pyramid = MinMaxPyramid(RR)
+        self.plotted_artifacts = {}
+        if len(RR) == 0:
+            # The last recording was closed
+            self.points_poincare.setData([], [])
+            self.timeline_sdnn.setData([], [])
+            self.timeline_rmssd.setData([], [])
+            self.update_visible_signal()
+            self.plot_artifacts()
+            self.hrv_label.setText("")
+            return
+        self.plot_label.setXRange(-100, len(RR)+150, padding=0)
+        self.plot_label.setYRange(-100, RR.max()+150, padding=0)
 
         # Set x and y limits for the Poincaré plot
-        xy_min = min(self.examination.RR_intervals, key=lambda interval: interval.value).value - 5
-        xy_max = max(self.examination.RR_intervals, key=lambda interval: interval.value).value + 5
+        xy_min = RR.min() - 5
+        xy_max = RR.max() + 5
         self.plot_poincare.setXRange(xy_min, xy_max)
         self.plot_poincare.setYRange(xy_min, xy_max)
-        
-        x_values = [interval.value for interval in self.examination.RR_intervals[:-1]]
-        y_values = [interval.value for interval in self.examination.RR_intervals[1:]]
-        self.points_poincare.setData(x_values, y_values) 
-        self.plot_poincare.addItem(self.points_poincare)
-        self.plot_poincare.addItem(self.points_poin_art)
-        
-    def plot_artifacts(self):
-        """
-        Plotting artifacts on RR interval plot.
-        """
-
-        self.brush_colors = {'Tarvainen': pg.mkBrush(255, 196, 61, 255), 
-                            'Quotient': pg.mkBrush(6, 214, 160, 255),
-                            'Square': pg.mkBrush(248, 131, 121, 255),
-                            'T1': pg.mkBrush(192, 214, 223, 255),
-                            'T2': pg.mkBrush(192, 50, 33, 255),
-                            'T3': pg.mkBrush(157, 68, 181, 255),
-                            'Manual': pg.mkBrush(68, 43, 72, 255)}
-
-        self.scatter_points = {'Tarvainen': pg.ScatterPlotItem(), 
-                                'Quotient': pg.ScatterPlotItem(),
-                                'Square': pg.ScatterPlotItem(),
-                                'T1': pg.ScatterPlotItem(),
-                                'T2': pg.ScatterPlotItem(),
-                                'T3': pg.ScatterPlotItem(),
-                                'Manual': pg.ScatterPlotItem()}
-
-        self.scatter_poincare = {'Tarvainen': pg.ScatterPlotItem(), 
-                                'Quotient': pg.ScatterPlotItem(),
-                                'Square': pg.ScatterPlotItem(),
-                                'T1': pg.ScatterPlotItem(),
-                                'T2': pg.ScatterPlotItem(),
-                                'T3': pg.ScatterPlotItem(),
-                                'Manual': pg.ScatterPlotItem()}
-
-        # clear previously found artifacts
-        self.p3.clear()
-        self.plot_poincare.clear()
-        self.update_plot()
+        self.points_poincare.setData(RR[:-1], RR[1:])
 
-        # adding new scatterpoints
-        for key in self.scatter_points.keys():
-            # add artifacts on examination plot
-            self.scatter_points[key] = pg.ScatterPlotItem(self.examination.artifacts[key], 
-                                       list(map(lambda idx: self.examination.RR_intervals[idx].value, self.examination.artifacts[key])),            
-                                       brush=self.brush_colors[key], hoverable=True)
-            self.p3.addItem(self.scatter_points[key])
+        # Time-domain params in 5 min windows moved by 30 s
+        windows = count_time_domain_windows(RR)
+        middle = (windows["start"] + windows["stop"]) / 2
+        self.timeline_sdnn.setData(middle, windows["sdnn"], connect='finite')
+        self.timeline_rmssd.setData(middle, windows["rmssd"], connect='finite')
 
-            # add artifacts on pioncare plot
-            RRi1_list = np.array([x - 1 for x in self.examination.artifacts[key]])
-            if len(RRi1_list) > 0:
-                self.scatter_poincare[key] = pg.ScatterPlotItem(list(map(lambda idx: self.examination.RR_intervals[idx].value, RRi1_list.tolist())),
-                                                                list(map(lambda idx: self.examination.RR_intervals[idx].value, self.examination.artifacts[key])), 
-                                                                brush=self.brush_colors[key],
-                                                                hoverable=True)
-            self.plot_poincare.addItem(self.scatter_poincare[key])
+        # Values under all artifacts may have changed
+        self.update_visible_signal()
+        self.plot_artifacts()
+        self.legend.setPos(self.legend.mapFromItem(self.legend, QtCore.QPointF(0, RR.max())))
 
+        # HRV depends only on the signal, not on artifacts marked on it
+        state = (id(self.examination), self.examination.version)
+        if self.hrv_state != state and getattr(self.tasks.get("HRV"), "state", None) != state:
+            self.update_hrv_params()
 
+    def update_visible_signal(self):
+        """
+        Drawing visible part of RR signal and its artifacts at screen resolution
+        """
+        x_start, x_stop = self.plot_label.vb.viewRange()[0]
+        x, y = self.rr_pyramid.visible(x_start, x_stop, 2 * max(self.plot_label.vb.width(), 100))
+        self.RRs.setData(x, y)
+        for key, idx in self.plotted_artifacts.items():
+            self.plot_artifacts_in_view(key, idx)
 
-        # Legend
-        self.legend.clear()
+    def plot_artifacts_in_view(self, key, idx):
+        """
+        Plotting artifacts of one type that are in the visible range of RR interval plot
+        """
+        x_start, x_stop = self.plot_label.vb.viewRange()[0]
+        shown = idx[np.searchsorted(idx, x_start):np.searchsorted(idx, x_stop, side='right')]
+        self.scatter_points[key].setData(shown, self.examination.RR[shown])
+        
+    @timing.timed()
+    def plot_artifacts(self):
+        """
+        Plotting artifacts on RR interval plot. Only artifact types whose
+        indices changed since the last call are sent to the plots.
+        """
+        RR = self.examination.RR
         for key in self.scatter_points.keys():
-            self.legend.addItem(self.scatter_points[key], key)
-        self.legend.setPos(self.legend.mapFromItem(self.legend, QtCore.QPointF(0, max(self.examination.RR_intervals, key=lambda interval: interval.value).value)))
+            idx = self.examination.artifact_indices(key)
+            if np.array_equal(self.plotted_artifacts.get(key), idx):
+                continue
+            # artifacts on examination plot
+            self.plot_artifacts_in_view(key, idx)
+            # artifacts on pioncare plot
+            idx_next = idx[idx > 0]
+            self.scatter_poincare[key].setData(RR[idx_next - 1], RR[idx_next])
+            self.plotted_artifacts[key] = idx
@@ -0,0 +1,58 @@
+"""
+Module responsible for running heavy computations outside of the GUI thread
+"""
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class Cancelled(Exception):
+    """
+    Raised inside a task which was cancelled
+    """
+
+
+class WorkerSignals(QObject):
+    """
+    Signals of a worker - delivered to the GUI thread
+    """
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    # Emitted last, also by cancelled tasks
+    ended = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """
+    Task running function(*args, progress=callback, **kwargs) in a thread pool.
+    The function should call progress(percent) between its stages - the call
+    reports progress and raises Cancelled once the task was cancelled. Results
+    of cancelled tasks are never emitted.
+    """
+    def __init__(self, function, *args, **kwargs):
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def report(self, percent):
+        if self.cancelled:
+            raise Cancelled()
+        self.signals.progress.emit(int(percent))
+
+    def run(self):
+        try:
+            result = self.function(*self.args, progress=self.report, **self.kwargs)
+            if not self.cancelled:
+                self.signals.finished.emit(result)
+        except Cancelled:
+            pass
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.failed.emit(f"{type(e).__name__}: {e}")
+        finally:
+            self.signals.ended.emit()
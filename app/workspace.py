@@ -0,0 +1,176 @@
+"""
+Module responsible for the workspace of recordings open at the same time.
+
+Every recording keeps its examination and undo journal. When recordings held
+in memory take more than the memory budget (CORRECTION_WORKSPACE_MB
+environment variable, 512 MB by default), the least recently used inactive
+ones are written to a temporary directory and read back when selected again.
+"""
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from examination import Examination
+from journal import Journal
+
+MEMORY_BUDGET_MB = float(os.environ.get("CORRECTION_WORKSPACE_MB", 512))
+
+
+def examination_nbytes(exam):
+    """
+    Memory taken by per-interval arrays of examination and its Tarvainen classes
+    """
+    arrays = [exam.RR, exam.artifact_type, exam.corrections, exam.artifact_mask,
+              *exam.tarvainen_classes.values()]
+    return sum(np.asarray(array).nbytes for array in arrays)
+
+
+def journal_nbytes(journal):
+    """
+    Memory taken by deltas of undo and redo stacks of journal
+    """
+    return sum(delta.nbytes for delta in journal.undo_stack + journal.redo_stack)
+
+
+class Recording():
+    """
+    Examination open in the workspace together with its undo journal. Both are
+    None while the recording is evicted to evicted_path.
+    """
+    def __init__(self, key, name, examination, journal=None):
+        self.key = key
+        self.name = name
+        self.examination = examination
+        self.journal = journal if journal is not None else Journal()
+        self.evicted_path = None
+
+    @property
+    def loaded(self):
+        return self.examination is not None
+
+    @property
+    def nbytes(self):
+        if not self.loaded:
+            return 0
+        return examination_nbytes(self.examination) + journal_nbytes(self.journal)
+
+
+def _dump(recording, path):
+    """
+    Write examination and journal of recording to path. Only rows of correction
+    counts of corrected intervals are stored.
+    """
+    state = dict(recording.examination.__dict__)
+    corrections = state.pop("corrections")
+    corrected = np.flatnonzero(corrections.any(axis=1))
+    state["corrections"] = (corrections.shape, corrections.dtype, corrected, corrections[corrected])
+    with open(path, "wb") as f:
+        pickle.dump((state, recording.journal), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load(path):
+    """
+    Examination and journal written with _dump
+    """
+    with open(path, "rb") as f:
+        state, journal = pickle.load(f)
+    shape, dtype, corrected, rows = state["corrections"]
+    state["corrections"] = np.zeros(shape, dtype=dtype)
+    state["corrections"][corrected] = rows
+    examination = Examination.__new__(Examination)
+    examination.__dict__.update(state)
+    return examination, journal
+
+
+class Workspace():
+    """
+    Recordings open at the same time, ordered from the least recently used
+    """
+    def __init__(self, budget_mb=MEMORY_BUDGET_MB, directory=None):
+        self.budget = budget_mb * 2 ** 20
+        self.recordings = OrderedDict()
+        self.active = None
+        self.directory = tempfile.mkdtemp(prefix="correction-workspace-", dir=directory)
+        # Evicted recordings are removed together with the workspace or at exit
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+    def __contains__(self, key):
+        return key in self.recordings
+
+    def __len__(self):
+        return len(self.recordings)
+
+    @property
+    def nbytes(self):
+        """
+        Memory taken by recordings which are not evicted
+        """
+        return sum(recording.nbytes for recording in self.recordings.values())
+
+    def add(self, key, name, examination):
+        """
+        Add examination (replacing one with the same key) and make it active
+        """
+        self.remove(key)
+        self.recordings[key] = Recording(key, name, examination)
+        return self.select(key)
+
+    def select(self, key):
+        """
+        Make recording under key active, reading it back if it was evicted
+        """
+        recording = self.recordings[key]
+        if not recording.loaded:
+            recording.examination, recording.journal = _load(recording.evicted_path)
+        self.recordings.move_to_end(key)
+        self.active = key
+        self.evict()
+        return recording
+
+    def replace(self, examination):
+        """
+        Replace examination of the active recording, e.g. with its corrected copy
+        """
+        if self.active is not None:
+            self.recordings[self.active].examination = examination
+
+    def remove(self, key):
+        """
+        Close recording under key
+        """
+        recording = self.recordings.pop(key, None)
+        if recording is not None and recording.evicted_path is not None:
+            os.remove(recording.evicted_path)
+        if self.active == key:
+            self.active = None
+
+    def evict(self):
+        """
+        Write least recently used inactive recordings to disk until the rest fits the budget
+        """
+        total = self.nbytes
+        for key, recording in self.recordings.items():
+            if total <= self.budget:
+                break
+            if key == self.active or not recording.loaded:
+                continue
+            total -= recording.nbytes
+            if recording.evicted_path is None:
+                fd, recording.evicted_path = tempfile.mkstemp(suffix=".pkl", dir=self.directory)
+                os.close(fd)
+            _dump(recording, recording.evicted_path)
+            recording.examination = None
+            recording.journal = None
+
+    def close(self):
+        """
+        Close all recordings and remove evicted ones from disk
+        """
+        self.recordings.clear()
+        self.active = None
+        self._cleanup()
@@ -0,0 +1,204 @@
+"""
+Benchmarks of parsing, artifact detection, correction and HRV analysis.
+
+usage: python benchmarks/run_benchmarks.py [--sizes N [N ...]] [--only PATTERN]
+           [-o RESULTS.json] [--baseline BASELINE.json] [--save-baseline]
+           [--tolerance RATIO]
+
+Every benchmark is run on synthetic recordings (see synthetic.py) of each
+size. Time is the best of --repeat runs; peak memory is measured with
+tracemalloc in a separate run, so tracing does not distort the timing.
+Results are written as JSON. With --baseline they are compared with a
+previous run and the script exits with status 1 if any benchmark got slower
+(or used more memory) by more than --tolerance times.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from artifacts import (detect_tarvainen, detect_t1, detect_t2, detect_t3,
+                       detect_quotient, detect_square, correct_artifacts)
+from decimation import MinMaxPyramid
+from detectors import DETECTORS, run_detectors
+from examination import Examination
+from export import export
+from hrv import (compute_hrv, count_time_domain, count_time_domain_windows, count_freq_domain,
+                 count_freq_domain_windows, count_nonlinear, count_entropy, count_dfa,
+                 calcTINN, test_stationarity, DFA_LONG_SCALES)
+from synthetic import generate_rr
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CORRECTION_METHODS = ("linear interpolation", "cubic splain", "deletion", "moving average", "pre mean")
+
+
+def _histogram(rr):
+    edges = np.arange(rr.min(), rr.max() + 7.8125, 7.8125)
+    return np.histogram(rr, edges)
+
+
+def _correction(method):
+    """
+    Benchmark of correct_artifacts with method on a fresh copy of the examination
+    """
+    def setup(data):
+        examination = data["examination"].copy()
+        examination.set_artifacts("Tarvainen", data["tarvainen"])
+        return examination
+
+    def run(examination):
+        correct_artifacts(examination, ["Tarvainen"], method, 0, len(examination.RR) - 1)
+    return setup, run
+
+
+def _export(fmt):
+    """
+    Benchmark of export of the examination to fmt next to the recording
+    """
+    def setup(data):
+        return data["examination"], f"{os.path.splitext(data['path'])[0]}_export.{fmt}"
+
+    def run(argument):
+        export(*argument, fmt)
+    return setup, run
+
+
+# name -> (setup(data) -> argument, run(argument), largest size the benchmark is run for)
+BENCHMARKS = {
+    "parse_txt": (lambda data: data["path"], lambda path: Examination(path, use_cache=False), None),
+    "detect_tarvainen": (lambda data: data["rr"], detect_tarvainen, None),
+    "detect_t1": (lambda data: data["rr"], lambda rr: detect_t1(rr, 200), None),
+    "detect_t2": (lambda data: data["rr"], lambda rr: detect_t2(rr, 400, 200), None),
+    "detect_t3": (lambda data: data["rr"], lambda rr: detect_t3(rr, 400, 200), None),
+    "detect_quotient": (lambda data: data["rr"], detect_quotient, None),
+    "detect_square": (lambda data: data["rr"], detect_square, None),
+    "run_detectors[all]": (lambda data: data["rr"], lambda rr: run_detectors(rr, dict.fromkeys(DETECTORS)), None),
+    **{f"correct[{method}]": (*_correction(method), None) for method in CORRECTION_METHODS},
+    "count_time_domain": (lambda data: data["rr"], count_time_domain, None),
+    "count_time_domain_windows": (lambda data: data["rr"], count_time_domain_windows, None),
+    "calcTINN": (lambda data: _histogram(data["rr"]), lambda hist: calcTINN(*hist), None),
+    "count_freq_domain": (lambda data: data["rr"], count_freq_domain, None),
+    "count_freq_domain_windows": (lambda data: data["rr"], count_freq_domain_windows, None),
+    "count_nonlinear": (lambda data: data["rr"], lambda rr: count_nonlinear(rr, entropy=False), None),
+    "count_dfa": (lambda data: data["rr"], lambda rr: count_dfa(rr, DFA_LONG_SCALES), None),
+    "count_entropy": (lambda data: data["rr"], count_entropy, 100000),
+    "stationarity[adf-fixed]": (lambda data: data["rr"], lambda rr: test_stationarity(rr, "adf-fixed"), None),
+    "stationarity[adf-decimated]": (lambda data: data["rr"], lambda rr: test_stationarity(rr, "adf-decimated"), None),
+    "stationarity[drift]": (lambda data: data["rr"], lambda rr: test_stationarity(rr, "drift"), None),
+    "stationarity[adf]": (lambda data: data["rr"], lambda rr: test_stationarity(rr, "adf"), 10000),
+    "compute_hrv": (lambda data: data["rr"], lambda rr: compute_hrv(rr, entropy=False), None),
+    "plot_pyramid": (lambda data: data["rr"], MinMaxPyramid, None),
+    **{f"export[{fmt}]": (*_export(fmt), None) for fmt in ("txt", "csv", "npz")},
+}
+
+
+def prepare(size, directory):
+    """
+    Synthetic recording of given size: RR array, txt file and parsed examination
+    """
+    rr, _ = generate_rr(size, seed=size)
+    path = os.path.join(directory, f"rr_{size}.txt")
+    np.savetxt(path, rr, fmt="%d")
+    examination = Examination(path, use_cache=False)
+    return {"rr": rr.astype(float), "path": path, "examination": examination,
+            "tarvainen": detect_tarvainen(rr.astype(float))}
+
+
+def measure(setup, run, data, repeat):
+    """
+    Best time [s] of repeat runs and peak memory [MB] allocated during one run
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup(data)
+        start = time.perf_counter()
+        run(argument)
+        times.append(time.perf_counter() - start)
+
+    argument = setup(data)
+    tracemalloc.start()
+    run(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 2 ** 20
+
+
+def compare(results, baseline, tolerance):
+    """
+    List of regressions of results against baseline
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric in ("time_s", "peak_mb"):
+            old, new = baseline[key][metric], result[metric]
+            # Ignore noise of very short or very small measurements
+            floor = 1e-3 if metric == "time_s" else 1.0
+            if new > tolerance * max(old, floor):
+                regressions.append(f"{key}: {metric} {old:.4g} -> {new:.4g} ({new / max(old, floor):.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark detectors, correction and HRV analysis.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of beats (default: 1k to 1M)")
+    parser.add_argument("--only", default="*", help="run only benchmarks matching this glob pattern")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs of each benchmark (default: 3)")
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline to compare with (default: benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown ratio (default: 1.5)")
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings("ignore")
+    names = [name for name in BENCHMARKS if fnmatch.fnmatch(name, args.only)]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            data = prepare(size, directory)
+            for name in names:
+                setup, run, max_size = BENCHMARKS[name]
+                if max_size is not None and size > max_size:
+                    continue
+                elapsed, peak = measure(setup, run, data, args.repeat)
+                results[f"{name}@{size}"] = {"name": name, "size": size, "time_s": elapsed, "peak_mb": peak}
+                print(f"{name:32} {size:>8} {elapsed * 1000:>10.2f} ms {peak:>9.1f} MB", flush=True)
+
+    report = {"meta": {"python": platform.python_version(), "numpy": np.__version__,
+                       "machine": platform.machine(), "processor": platform.processor(),
+                       "date": time.strftime("%Y-%m-%d %H:%M:%S")},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regressions against {args.baseline}")
+        status = 1 if regressions else 0
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Baseline saved to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
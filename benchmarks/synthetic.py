@@ -0,0 +1,58 @@
+"""
+Synthetic RR series with injected artifacts for benchmarks
+"""
+import numpy as np
+
+
+def generate_rr(n, seed=0, ectopic=0.01, missed=0.005, extra=0.005, mean=800, sd=50):
+    """
+    Generate about n RR intervals [ms] with LF and HF oscillations and noise, then
+    inject artifacts. ectopic, missed and extra are fractions of beats turned into:
+    - ectopic: premature beat followed by a compensatory pause,
+    - missed: two consecutive intervals merged into one (undetected beat),
+    - extra: an interval split in two (false beat).
+    Returns (RR as integer milliseconds, dict of indices of injected artifacts
+    in the returned series).
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    rr = (mean
+          + 0.6 * sd * np.sin(2 * np.pi * 0.1 * t * mean / 1000 + rng.uniform(0, 2 * np.pi))
+          + 0.4 * sd * np.sin(2 * np.pi * 0.25 * t * mean / 1000 + rng.uniform(0, 2 * np.pi))
+          + 0.5 * sd * rng.standard_normal(n))
+
+    # Draw disjoint positions for each artifact kind, away from the edges
+    positions = rng.permutation(np.arange(2, max(n - 2, 2)))
+    counts = [int(n * fraction) for fraction in (ectopic, missed, extra)]
+    ectopic_idx, missed_idx, extra_idx = np.split(positions[:sum(counts)], np.cumsum(counts)[:-1])
+    ectopic_idx = np.sort(ectopic_idx)
+    # Ectopic beat shortens its interval and lengthens the next one by the same amount
+    shift = 0.3 * rr[ectopic_idx]
+    rr[ectopic_idx] -= shift
+    rr[ectopic_idx + 1] += shift
+
+    # Missed beats: interval i absorbs interval i + 1, which is then dropped
+    keep = np.ones(n, dtype=bool)
+    missed_idx = np.sort(missed_idx[~np.isin(missed_idx + 1, ectopic_idx) & ~np.isin(missed_idx, ectopic_idx + 1)])
+    missed_idx = missed_idx[np.diff(missed_idx, prepend=-2) > 1]
+    rr[missed_idx] += rr[missed_idx + 1]
+    keep[missed_idx + 1] = False
+
+    # Extra beats: interval i is split into two parts
+    extra_idx = np.sort(extra_idx[keep[extra_idx] & ~np.isin(extra_idx, missed_idx)])
+    split = rng.uniform(0.3, 0.7, len(extra_idx))
+    repeat = np.ones(n, dtype=int)
+    repeat[extra_idx] = 2
+    repeat[~keep] = 0
+    values = np.repeat(rr, repeat)
+    fraction = np.repeat(np.ones(n), repeat)
+    # Position of the first part of every split interval in the output
+    first = np.cumsum(repeat) - repeat
+    fraction[first[extra_idx]] = split
+    fraction[first[extra_idx] + 1] = 1 - split
+    values = np.round(values * fraction)
+
+    injected = {"ectopic": first[ectopic_idx],
+                "missed": first[missed_idx],
+                "extra": first[extra_idx]}
+    return values, injected